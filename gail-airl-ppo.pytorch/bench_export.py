@@ -0,0 +1,69 @@
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import torch
+
+from gail_airl_ppo.export import (
+    actor_from_state_dict, actor_shapes, export_actor, load_exported_actor)
+from bench_utils import latencies, load_actor
+
+
+def run(args):
+    torch.manual_seed(args.seed)
+    actor = load_actor(args.actor, args.hidden_activation)
+    state_dict = actor.state_dict()
+    state_shape, action_shape = actor_shapes(actor)
+
+    path = os.path.join(tempfile.mkdtemp(), 'actor.pt')
+    export_actor(actor, path, state_shape, action_shape)
+    pth = os.path.join(os.path.dirname(path), 'actor.pth')
+    torch.save(state_dict, pth)
+
+    # Startup: rebuilding the class and loading weights vs loading the module
+    start = time.perf_counter()
+    actor_from_state_dict(torch.load(pth), args.hidden_activation)
+    load_eager = time.perf_counter() - start
+    start = time.perf_counter()
+    module, _ = load_exported_actor(path)
+    load_script = time.perf_counter() - start
+    print(f"load: eager {load_eager * 1e3:.1f} ms, TorchScript {load_script * 1e3:.1f} ms")
+
+    states = torch.randn(args.num_steps, *state_shape)
+    with torch.no_grad():
+        error = (module(states) - actor(states)).abs().max().item()
+    print(f"max |action| difference: {error:.3e}")
+    print(f"torch threads: {torch.get_num_threads()}")
+
+    # Both paths under the same autograd context, so only the module differs
+    def eager(x):
+        with torch.inference_mode():
+            return actor(x)
+
+    def scripted(x):
+        with torch.inference_mode():
+            return module(x)
+
+    print(f"{'batch':>6} {'path':<12}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+    for batch_size in (1, args.batch_size):
+        num = args.num_steps // batch_size
+        inputs = list(states[:num * batch_size].view(num, batch_size, *state_shape))
+        for name, fn in (('eager', eager), ('torchscript', scripted)):
+            t = latencies(fn, inputs, min(args.warmup, num // 10))
+            print(f"{batch_size:>6} {name:<12}{t.mean():10.1f}"
+                  f"{np.percentile(t, 50):10.1f}{np.percentile(t, 99):10.1f}")
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(
+        description="Compare the exported TorchScript actor with the eager actor.")
+    p.add_argument('--actor', type=str, default=None,
+                   help='actor.pth (a random 46-64-64-23 actor if omitted)')
+    p.add_argument('--hidden_activation', type=str, default='tanh', choices=['tanh', 'relu'])
+    p.add_argument('--batch_size', type=int, default=256)
+    p.add_argument('--num_steps', type=int, default=20000)
+    p.add_argument('--warmup', type=int, default=1000)
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args()
+    run(args)
@@ -0,0 +1,67 @@
+import time
+import argparse
+import torch
+
+from gail_airl_ppo.algo.ppo import calculate_gae
+
+
+def calculate_gae_loop(values, rewards, dones, next_values, gamma, lambd):
+    # The previous implementation: a Python loop over the rollout.
+    deltas = rewards + gamma * next_values * (1 - dones) - values
+    gaes = torch.empty_like(rewards)
+
+    gaes[-1] = deltas[-1]
+    for t in reversed(range(rewards.size(0) - 1)):
+        gaes[t] = deltas[t] + gamma * lambd * (1 - dones[t]) * gaes[t + 1]
+
+    returns = gaes + values
+    gaes = (gaes - gaes.mean()) / (gaes.std() + 1e-8)
+    gaes = torch.clamp(gaes, -10.0, 10.0)
+
+    return returns, gaes
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(args):
+    torch.manual_seed(args.seed)
+    n = args.rollout_length
+    values = torch.randn(n, 1)
+    next_values = torch.randn(n, 1)
+    rewards = torch.randn(n, 1)
+    dones = (torch.rand(n, 1) < args.p_done).float()
+
+    returns_loop, gaes_loop = calculate_gae_loop(
+        values, rewards, dones, next_values, args.gamma, args.lambd)
+    returns_vec, gaes_vec = calculate_gae(
+        values, rewards, dones, next_values, args.gamma, args.lambd)
+
+    print(f"rollout_length={n}")
+    print(f"max |returns| difference: {(returns_loop - returns_vec).abs().max().item():.3e}")
+    print(f"max |gaes| difference:    {(gaes_loop - gaes_vec).abs().max().item():.3e}")
+
+    time_loop = best_time(lambda: calculate_gae_loop(
+        values, rewards, dones, next_values, args.gamma, args.lambd), args.repeat)
+    time_vec = best_time(lambda: calculate_gae(
+        values, rewards, dones, next_values, args.gamma, args.lambd), args.repeat)
+    print(f"loop:       {time_loop * 1e3:9.2f} ms")
+    print(f"vectorized: {time_vec * 1e3:9.2f} ms  ({time_loop / time_vec:.0f}x)")
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description="Compare the vectorized GAE with the Python loop.")
+    p.add_argument('--rollout_length', type=int, default=50000)
+    p.add_argument('--gamma', type=float, default=0.995)
+    p.add_argument('--lambd', type=float, default=0.97)
+    p.add_argument('--p_done', type=float, default=0.001)
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args()
+    run(args)
@@ -0,0 +1,54 @@
+import argparse
+import numpy as np
+import torch
+
+from gail_airl_ppo.numpy_policy import numpy_policy_from_state_dict
+from bench_utils import latencies, load_actor
+
+
+def run(args):
+    torch.manual_seed(args.seed)
+    actor = load_actor(args.actor, 'tanh', args.state_dim, args.action_dim)
+    policy = numpy_policy_from_state_dict(actor.state_dict())
+    if args.output is not None:
+        policy.save(args.output)
+        print(f"NumPy policy saved to {args.output}")
+
+    rng = np.random.RandomState(args.seed)
+    states = rng.randn(args.num_steps, policy.state_dim).astype(np.float32)
+
+    with torch.no_grad():
+        actions_torch = actor(torch.from_numpy(states)).numpy()
+    actions_numpy = np.stack([policy(state) for state in states])
+    print(f"max |action| difference: {np.abs(actions_torch - actions_numpy).max():.3e}")
+
+    def torch_step(state):
+        # The per-step path of Algorithm.exploit
+        state = torch.tensor(state, dtype=torch.float)
+        with torch.no_grad():
+            action = actor(state.unsqueeze_(0))
+        return action.cpu().numpy()[0]
+
+    action = np.empty(policy.action_dim, dtype=np.float32)
+    print(f"torch threads: {torch.get_num_threads()}")
+    print(f"{'path':<8}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'max us':>10}")
+    for name, fn in (('torch', torch_step),
+                     ('numpy', lambda state: policy(state, out=action))):
+        t = latencies(fn, states, args.warmup)
+        print(f"{name:<8}{t.mean():10.1f}{np.percentile(t, 50):10.1f}"
+              f"{np.percentile(t, 99):10.1f}{t.max():10.1f}")
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(
+        description="Compare single-step latency of the NumPy and torch actors.")
+    p.add_argument('--actor', type=str, default=None,
+                   help='actor.pth of a StateIndependentPolicy (random weights if omitted)')
+    p.add_argument('--output', type=str, default=None, help='save the NumPy policy (.npz)')
+    p.add_argument('--state_dim', type=int, default=46)
+    p.add_argument('--action_dim', type=int, default=23)
+    p.add_argument('--num_steps', type=int, default=20000)
+    p.add_argument('--warmup', type=int, default=1000)
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args()
+    run(args)
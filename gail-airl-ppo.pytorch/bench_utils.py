@@ -0,0 +1,48 @@
+import time
+import numpy as np
+import torch
+from torch import nn
+
+from gail_airl_ppo.network import StateIndependentPolicy
+from gail_airl_ppo.export import actor_from_state_dict
+
+
+def latencies(fn, inputs, warmup):
+    """Per-call latency of fn over inputs in microseconds, after warmup calls"""
+    for x in inputs[:warmup]:
+        fn(x)
+    times = np.empty(len(inputs))
+    for i, x in enumerate(inputs):
+        start = time.perf_counter_ns()
+        fn(x)
+        times[i] = time.perf_counter_ns() - start
+    return times / 1e3
+
+
+def load_actor(path=None, hidden_activation='tanh', state_dim=46, action_dim=23):
+    """
+    The actor saved at path (actor.pth), or a randomly initialized
+    state_dim-64-64-action_dim PPO actor if path is None.
+    """
+    if path is not None:
+        state_dict = torch.load(path, map_location='cpu')
+    else:
+        state_dict = StateIndependentPolicy(
+            state_shape=(state_dim,), action_shape=(action_dim,), hidden_units=(64, 64),
+            hidden_activation=nn.Tanh()).state_dict()
+    return actor_from_state_dict(state_dict, hidden_activation)
+
+
+def run_episode(env, actor, seed, max_steps):
+    """Return and visited states of one seeded episode of the deterministic actor"""
+    state, _ = env.reset(seed=seed)
+    states, episode_return = [], 0.0
+    for _ in range(max_steps):
+        states.append(state.copy())
+        with torch.no_grad():
+            action = actor(torch.from_numpy(state).unsqueeze_(0)).numpy()[0]
+        state, reward, terminated, truncated, _ = env.step(action)
+        episode_return += reward
+        if terminated or truncated:
+            break
+    return episode_return, np.stack(states)
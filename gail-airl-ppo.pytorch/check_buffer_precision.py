@@ -0,0 +1,96 @@
+import os
+import argparse
+import tempfile
+import numpy as np
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from gail_airl_ppo.buffer import SerializedBuffer
+from gail_airl_ppo.network import GAILDiscrim, StateFunction
+
+DTYPES = {
+    'float16': torch.float16,
+    'bfloat16': torch.bfloat16,
+}
+
+
+def disc_loss(disc, states, actions):
+    # GAIL loss with the buffer as expert data and shuffled actions as policy data.
+    logits_exp = torch.clamp(disc(states, actions), -10.0, 10.0)
+    logits_pi = torch.clamp(disc(states, actions.flip(0)), -10.0, 10.0)
+    return -F.logsigmoid(-logits_pi).mean() - F.logsigmoid(logits_exp).mean()
+
+
+def critic_loss(critic, states, rewards, dones, next_states, gamma):
+    targets = rewards + gamma * critic(next_states) * (1 - dones)
+    return (critic(states) - targets).pow_(2).mean()
+
+
+def synthetic_buffer(path, size, state_dim, action_dim, seed):
+    rng = np.random.RandomState(seed)
+    states = rng.randn(size + 1, state_dim).astype(np.float32)
+    dones = torch.from_numpy(rng.rand(size, 1) < 0.01)
+    torch.save({
+        'state': torch.from_numpy(states[:-1]),
+        'action': torch.from_numpy(rng.uniform(-1, 1, (size, action_dim)).astype(np.float32)),
+        'reward': torch.from_numpy(rng.randn(size, 1).astype(np.float32)),
+        'done': dones,
+        'next_state': torch.from_numpy(states[1:]),
+    }, path)
+
+
+def run(args):
+    device = torch.device('cpu')
+    path = args.buffer
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), 'synthetic.pth')
+        synthetic_buffer(path, args.size, 46, 23, args.seed)
+        print(f"No --buffer given; using {args.size} synthetic transitions")
+
+    buffer_full = SerializedBuffer(path, device)
+    state_shape = buffer_full.states.shape[1:]
+    action_shape = buffer_full.actions.shape[1:]
+
+    torch.manual_seed(args.seed)
+    disc = GAILDiscrim(state_shape, action_shape, hidden_activation=nn.Tanh())
+    critic = StateFunction(state_shape, hidden_activation=nn.Tanh())
+
+    full_bytes = buffer_full.states.element_size() * buffer_full.states.nelement()
+    print(f"{'dtype':<10}{'state MB':>10}{'disc loss rel err':>20}{'critic loss rel err':>22}")
+    print(f"{'float32':<10}{full_bytes / 2**20:10.1f}{0.0:20.2e}{0.0:22.2e}")
+    for name in args.dtypes:
+        buffer = SerializedBuffer(path, device, storage_dtype=DTYPES[name])
+        nbytes = buffer.states.element_size() * buffer.states.nelement()
+
+        disc_err, critic_err = [], []
+        with torch.no_grad():
+            for i in range(args.num_batches):
+                # The same rows from both buffers
+                np.random.seed(args.seed + i)
+                batch_full = buffer_full.sample(args.batch_size)
+                np.random.seed(args.seed + i)
+                batch = buffer.sample(args.batch_size)
+
+                for losses, fn in (
+                        (disc_err, lambda b: disc_loss(disc, b[0], b[1])),
+                        (critic_err, lambda b: critic_loss(
+                            critic, b[0], b[2], b[3], b[4], args.gamma))):
+                    loss_full, loss = fn(batch_full).item(), fn(batch).item()
+                    losses.append(abs(loss - loss_full) / max(abs(loss_full), 1e-8))
+
+        print(f"{name:<10}{nbytes / 2**20:10.1f}{max(disc_err):20.2e}{max(critic_err):22.2e}")
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(
+        description="Compare losses on reduced-precision buffer storage with float32.")
+    p.add_argument('--buffer', type=str, default=None)
+    p.add_argument('--dtypes', nargs='+', default=list(DTYPES), choices=list(DTYPES))
+    p.add_argument('--size', type=int, default=100000)
+    p.add_argument('--batch_size', type=int, default=4096)
+    p.add_argument('--num_batches', type=int, default=20)
+    p.add_argument('--gamma', type=float, default=0.995)
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args()
+    run(args)
@@ -0,0 +1,84 @@
+import io
+import argparse
+import numpy as np
+import torch
+
+from gail_airl_ppo.export import actor_shapes, quantize_actor
+from bench_utils import latencies, load_actor, run_episode
+from g1_env import G1Env
+
+
+def state_dict_bytes(actor):
+    f = io.BytesIO()
+    torch.save(actor.state_dict(), f)
+    return f.tell()
+
+
+def run(args):
+    torch.manual_seed(args.seed)
+    actor = load_actor(args.actor, args.hidden_activation)
+    actor_int8 = quantize_actor(actor)
+    state_shape, _ = actor_shapes(actor)
+    hidden_units = [layer.out_features for layer in actor.net[:-1:2]]
+    print(f"{type(actor).__name__} {state_shape[0]}-{'-'.join(map(str, hidden_units))}"
+          f", torch threads: {torch.get_num_threads()}")
+
+    # Both actors on the same seeded G1 episodes; the action error is taken
+    # on the states the float32 actor visits.
+    env = G1Env(verbose=False)
+    print(f"{'episode':>8}{'steps':>7}{'float32 ret':>13}{'int8 ret':>11}"
+          f"{'max |da|':>11}{'mean |da|':>11}")
+    returns, returns_int8, errors = [], [], []
+    for ep in range(args.episodes):
+        seed = args.seed + ep
+        episode_return, states = run_episode(env, actor, seed, args.max_steps)
+        episode_return_int8, _ = run_episode(env, actor_int8, seed, args.max_steps)
+        with torch.no_grad():
+            states = torch.from_numpy(states)
+            error = (actor_int8(states) - actor(states)).abs().numpy()
+        returns.append(episode_return)
+        returns_int8.append(episode_return_int8)
+        errors.append(error)
+        print(f"{ep:>8}{len(states):>7}{episode_return:13.2f}{episode_return_int8:11.2f}"
+              f"{error.max():11.2e}{error.mean():11.2e}")
+    env.close()
+    errors = np.concatenate(errors)
+    print(f"{'mean':>8}{'':>7}{np.mean(returns):13.2f}{np.mean(returns_int8):11.2f}"
+          f"{errors.max():11.2e}{errors.mean():11.2e}")
+
+    size, size_int8 = state_dict_bytes(actor), state_dict_bytes(actor_int8)
+    print(f"\nstate_dict: float32 {size / 1024:.1f} KiB, int8 {size_int8 / 1024:.1f} KiB"
+          f" ({size / size_int8:.1f}x smaller)")
+
+    states = torch.randn(args.num_steps, *state_shape)
+    print(f"{'batch':>6} {'path':<9}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+    for batch_size in (1, args.batch_size):
+        num = args.num_steps // batch_size
+        inputs = list(states[:num * batch_size].view(num, batch_size, *state_shape))
+        means = []
+        for name, module in (('float32', actor), ('int8', actor_int8)):
+            def forward(x):
+                with torch.inference_mode():
+                    return module(x)
+            t = latencies(forward, inputs, min(args.warmup, num // 10))
+            means.append(t.mean())
+            print(f"{batch_size:>6} {name:<9}{t.mean():10.1f}"
+                  f"{np.percentile(t, 50):10.1f}{np.percentile(t, 99):10.1f}")
+        print(f"{batch_size:>6} speedup {means[0] / means[1]:10.2f}x")
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(
+        description="Compare the dynamically quantized int8 actor with float32 on G1.")
+    p.add_argument('--actor', type=str, default=None,
+                   help='actor.pth (a random 46-64-64-23 actor if omitted)')
+    p.add_argument('--hidden_activation', type=str, default='tanh', choices=['tanh', 'relu'],
+                   help='tanh for PPO/GAIL/AIRL actors, relu for SAC')
+    p.add_argument('--episodes', type=int, default=5)
+    p.add_argument('--max_steps', type=int, default=1000)
+    p.add_argument('--batch_size', type=int, default=256)
+    p.add_argument('--num_steps', type=int, default=20000)
+    p.add_argument('--warmup', type=int, default=1000)
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args()
+    run(args)
@@ -14,7 +14,8 @@ def run(args):
         state_shape=env.observation_space.shape,
         action_shape=env.action_space.shape,
         device=torch.device("cuda" if args.cuda else "cpu"),
-        path=args.weight
+        path=args.weight,
+        units_actor=tuple(args.units_actor)
     )
 
     buffer = collect_demo(
@@ -37,6 +38,7 @@ if __name__ == '__main__':
     p = argparse.ArgumentParser()
     p.add_argument('--weight', type=str, required=True)
     p.add_argument('--env_id', type=str, default='Hopper-v3')
+    p.add_argument('--units_actor', type=int, nargs='+', default=[256, 256])
     p.add_argument('--buffer_size', type=int, default=10**6)
     p.add_argument('--std', type=float, default=0.0)
     p.add_argument('--p_rand', type=float, default=0.0)
@@ -0,0 +1,41 @@
+import os
+import argparse
+import torch
+
+from gail_airl_ppo.buffer import (
+    save_columnar, load_columnar, dedup_next_states, expand_next_states)
+
+
+def convert(input_path, output_path):
+    """Convert a .pth buffer (Buffer.save / make_buffer.py) to a columnar directory"""
+    tmp = torch.load(input_path)
+    next_states = expand_next_states(tmp)
+    if 'next_index' not in tmp:
+        # Files with only full next states; keep each state only once.
+        next_index, terminal_states = dedup_next_states(tmp['state'], tmp['next_state'])
+        tmp['next_index'] = torch.from_numpy(next_index)
+        tmp['terminal_state'] = terminal_states
+    tmp.pop('next_state', None)
+    save_columnar(output_path, tmp)
+
+    # Check that the columnar copy reads back identically
+    columns = load_columnar(output_path)
+    for name, column in tmp.items():
+        assert torch.equal(columns[name], column.cpu()), f"Column {name} differs"
+    assert torch.equal(expand_next_states(columns), next_states.cpu()), "Next states differ"
+
+    print(f"Columnar buffer saved to {output_path}")
+    for name, column in columns.items():
+        print(f"  {name:<12} {str(tuple(column.shape)):<16} {column.dtype}")
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(
+        description="Convert a .pth buffer into the memory-mapped columnar format.")
+    p.add_argument('--input', type=str, required=True, help='Path to the .pth buffer')
+    p.add_argument('--output', type=str, default=None,
+                   help='Output directory (defaults to the input path without .pth)')
+    args = p.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0]
+    convert(args.input, output)
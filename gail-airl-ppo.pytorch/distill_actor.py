@@ -0,0 +1,187 @@
+import os
+import time
+import argparse
+import numpy as np
+import torch
+from torch import nn
+
+from gail_airl_ppo.buffer import SerializedBuffer
+from gail_airl_ppo.network import StateDependentPolicy, StateIndependentPolicy
+from gail_airl_ppo.export import actor_from_state_dict, actor_shapes
+from g1_env import G1Env, G1VecEnv
+from bench_utils import run_episode
+
+
+def collect_states(teacher, num_steps, num_envs, std, seed):
+    """States visited by the teacher, with Gaussian action noise for coverage"""
+    env = G1VecEnv(num_envs)
+    rng = np.random.RandomState(seed)
+    obs, _ = env.reset(seed=seed)
+    states = np.empty((-(-num_steps // num_envs) * num_envs, obs.shape[1]), dtype=np.float32)
+    for start in range(0, len(states), num_envs):
+        states[start:start + num_envs] = obs
+        with torch.no_grad():
+            actions = teacher(torch.from_numpy(obs)).numpy()
+        actions += std * rng.randn(*actions.shape)
+        obs, _, _, _, _ = env.step(np.clip(actions, -1.0, 1.0))
+    env.close()
+    return torch.from_numpy(states[:num_steps])
+
+
+def teacher_targets(teacher, states, batch_size):
+    """Deterministic actions and clamped log stds of the teacher"""
+    actions, log_stds = [], []
+    with torch.no_grad():
+        for batch in states.split(batch_size):
+            actions.append(teacher(batch))
+            if isinstance(teacher, StateDependentPolicy):
+                log_std = teacher.net(batch).chunk(2, dim=-1)[1].clamp(-20, 2)
+            else:
+                log_std = teacher.log_stds.expand_as(actions[-1])
+            log_stds.append(log_std)
+    return torch.cat(actions), torch.cat(log_stds)
+
+
+def make_student(kind, state_shape, action_shape, hidden_units):
+    if kind == 'sac':
+        # The architecture SACExpert loads (with units_actor=hidden_units)
+        return StateDependentPolicy(
+            state_shape=state_shape,
+            action_shape=action_shape,
+            hidden_units=hidden_units,
+            hidden_activation=nn.ReLU(inplace=True)
+        )
+    return StateIndependentPolicy(
+        state_shape=state_shape,
+        action_shape=action_shape,
+        hidden_units=hidden_units,
+        hidden_activation=nn.Tanh()
+    )
+
+
+def student_outputs(student, states):
+    if isinstance(student, StateDependentPolicy):
+        means, log_stds = student.net(states).chunk(2, dim=-1)
+        return torch.tanh(means), log_stds
+    return student(states), None
+
+
+def step_latency(actor, state_shape, num_steps=5000):
+    states = torch.randn(num_steps, 1, *state_shape)
+    with torch.inference_mode():
+        for state in states[:500]:
+            actor(state)
+        start = time.perf_counter()
+        for state in states:
+            actor(state)
+    return (time.perf_counter() - start) / num_steps * 1e6
+
+
+def run(args):
+    device = torch.device("cuda" if args.cuda else "cpu")
+    torch.manual_seed(args.seed)
+
+    path = args.teacher
+    if os.path.isdir(path):
+        path = os.path.join(path, 'actor.pth')
+    teacher = actor_from_state_dict(torch.load(path, map_location='cpu'), args.teacher_activation)
+    state_shape, action_shape = actor_shapes(teacher)
+
+    if args.buffer is not None:
+        states = SerializedBuffer(args.buffer, torch.device('cpu')).states.float()
+        print(f"{len(states)} states from {args.buffer}")
+    else:
+        states = collect_states(teacher, args.rollout_steps, args.num_envs, args.std, args.seed)
+        print(f"{len(states)} states from teacher rollouts (std {args.std})")
+    actions, log_stds = teacher_targets(teacher, states, args.batch_size)
+
+    # Hold out part of the states to measure the action error
+    perm = torch.randperm(len(states))
+    num_val = int(len(states) * args.val_fraction)
+    states, actions, log_stds = (x[perm].to(device) for x in (states, actions, log_stds))
+    train, val = slice(num_val, None), slice(None, num_val)
+    train_states, train_actions, train_log_stds = states[train], actions[train], log_stds[train]
+
+    student = make_student(args.student, state_shape, action_shape, tuple(args.units_actor)).to(device)
+    if isinstance(student, StateIndependentPolicy):
+        # A single std for all states; not learned by the regression
+        student.log_stds.data.copy_(train_log_stds.mean(dim=0, keepdim=True))
+    optim = torch.optim.Adam(student.parameters(), lr=args.lr)
+
+    num_train = len(train_states)
+    for epoch in range(1, args.epochs + 1):
+        total = 0.0
+        for idxes in torch.randperm(num_train, device=device).split(args.batch_size):
+            pred_actions, pred_log_stds = student_outputs(student, train_states[idxes])
+            loss = (pred_actions - train_actions[idxes]).pow_(2).mean()
+            if pred_log_stds is not None:
+                loss = loss + args.log_std_coef * (
+                    pred_log_stds - train_log_stds[idxes]).pow_(2).mean()
+            optim.zero_grad(set_to_none=True)
+            loss.backward()
+            optim.step()
+            total += loss.item() * len(idxes)
+        if epoch % args.log_interval == 0 or epoch == args.epochs:
+            message = f"epoch {epoch:4d}   loss {total / num_train:.3e}"
+            # The split is empty for a small buffer or --val_fraction 0
+            if num_val > 0:
+                with torch.no_grad():
+                    error = (student(states[val]) - actions[val]).abs()
+                message += f"   val |da| mean {error.mean().item():.3e} max {error.max().item():.3e}"
+            print(message)
+
+    student = student.cpu().eval()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    torch.save(student.state_dict(), args.output)
+
+    num_params = [sum(p.numel() for p in actor.parameters()) for actor in (teacher, student)]
+    latency = [step_latency(actor, state_shape) for actor in (teacher, student)]
+    print(f"\n{'':<8}{'params':>10}{'step us':>10}")
+    print(f"{'teacher':<8}{num_params[0]:>10}{latency[0]:10.1f}")
+    print(f"{'student':<8}{num_params[1]:>10}{latency[1]:10.1f}")
+
+    if args.episodes > 0:
+        env = G1Env(verbose=False)
+        print(f"\n{'episode':>8}{'teacher ret':>13}{'student ret':>13}")
+        returns = []
+        for ep in range(args.episodes):
+            returns.append([run_episode(env, actor, args.seed + ep, args.max_steps)[0]
+                            for actor in (teacher, student)])
+            print(f"{ep:>8}{returns[-1][0]:13.2f}{returns[-1][1]:13.2f}")
+        env.close()
+        mean = np.mean(returns, axis=0)
+        print(f"{'mean':>8}{mean[0]:13.2f}{mean[1]:13.2f}")
+
+    print(f"\nStudent saved to {args.output}")
+    if args.student == 'sac':
+        print(f"Load it with SACExpert(..., units_actor={tuple(args.units_actor)})")
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(
+        description="Distill a trained actor into a smaller MLP by regression on its actions.")
+    p.add_argument('--teacher', type=str, required=True, help='actor.pth or the directory holding it')
+    p.add_argument('--teacher_activation', type=str, default='relu', choices=['tanh', 'relu'],
+                   help='tanh for PPO/GAIL/AIRL actors, relu for SAC')
+    p.add_argument('--buffer', type=str, default=None,
+                   help='buffer (.pth or columnar directory) whose states are used; '
+                        'teacher rollouts on G1 if omitted')
+    p.add_argument('--rollout_steps', type=int, default=10**5)
+    p.add_argument('--num_envs', type=int, default=16)
+    p.add_argument('--std', type=float, default=0.1, help='action noise of the rollouts')
+    p.add_argument('--student', type=str, default='sac', choices=['sac', 'ppo'],
+                   help='sac: StateDependentPolicy (ReLU), ppo: StateIndependentPolicy (tanh)')
+    p.add_argument('--units_actor', type=int, nargs='+', default=[64, 64])
+    p.add_argument('--epochs', type=int, default=50)
+    p.add_argument('--batch_size', type=int, default=1024)
+    p.add_argument('--lr', type=float, default=1e-3)
+    p.add_argument('--log_std_coef', type=float, default=0.1)
+    p.add_argument('--val_fraction', type=float, default=0.05)
+    p.add_argument('--log_interval', type=int, default=10)
+    p.add_argument('--episodes', type=int, default=5)
+    p.add_argument('--max_steps', type=int, default=1000)
+    p.add_argument('--output', type=str, default='distilled/actor.pth')
+    p.add_argument('--cuda', action='store_true')
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args()
+    run(args)
@@ -3,6 +3,7 @@ import argparse
 import torch
 import torch.nn as nn
 from g1_env import make_g1_env
+from gail_airl_ppo.numpy_policy import numpy_policy_from_state_dict
 
 def build_mlp(input_dim, output_dim, hidden_units=[64, 64],
               hidden_activation=nn.Tanh(), output_activation=None):
@@ -37,7 +38,7 @@ class StateIndependentPolicy(nn.Module):
     def get_action(self, states):
         return self.forward(states).cpu().numpy()
 
-def evaluate_policy(env_id, model_path, render=True, episodes=5, seed=0):
+def evaluate_policy(env_id, model_path, render=True, episodes=5, seed=0, use_numpy=False):
     # Create environment
     print(f"Creating G1 environment...")
     render_mode = "human" if render else None
@@ -73,6 +74,10 @@ def evaluate_policy(env_id, model_path, render=True, episodes=5, seed=0):
     actor.eval()
     device = torch.device("cpu")
     print("Model loaded successfully!")
+    if use_numpy:
+        # Framework-free forward pass for the step loop
+        numpy_policy = numpy_policy_from_state_dict(actor.state_dict())
+        print("Using the NumPy actor")
     
     # Evaluate for some episodes
     total_reward = 0
@@ -94,8 +99,11 @@ def evaluate_policy(env_id, model_path, render=True, episodes=5, seed=0):
         
         while True:
             # Select action
-            with torch.no_grad():
-                action = actor.get_action(torch.FloatTensor(obs).to(device))
+            if use_numpy:
+                action = numpy_policy(obs)
+            else:
+                with torch.no_grad():
+                    action = actor.get_action(torch.FloatTensor(obs).to(device))
             
             # Execute action
             step_result = env.step(action)
@@ -146,6 +154,7 @@ if __name__ == "__main__":
     parser.add_argument("--seed", type=int, default=0, help="Random seed")
     parser.add_argument("--episodes", type=int, default=5, help="Number of episodes to evaluate")
     parser.add_argument("--no_render", action="store_true", help="Disable rendering")
+    parser.add_argument("--numpy", action="store_true", help="Run the actor with NumPy instead of torch")
     args = parser.parse_args()
     
     evaluate_policy(
@@ -153,5 +162,6 @@ if __name__ == "__main__":
         model_path=args.model_dir,
         render=not args.no_render,
         episodes=args.episodes,
-        seed=args.seed
+        seed=args.seed,
+        use_numpy=args.numpy
     ) 
\ No newline at end of file
@@ -0,0 +1,47 @@
+import os
+import argparse
+import torch
+
+from gail_airl_ppo.export import (
+    actor_from_state_dict, actor_shapes, export_actor, load_exported_actor,
+    quantize_actor)
+
+
+def run(args):
+    path = args.actor
+    if os.path.isdir(path):
+        path = os.path.join(path, 'actor.pth')
+    actor = actor_from_state_dict(
+        torch.load(path, map_location='cpu'), args.hidden_activation)
+    state_shape, action_shape = actor_shapes(actor)
+
+    output = args.output or os.path.splitext(path)[0] + '.pt'
+    export_actor(quantize_actor(actor) if args.quantize else actor,
+                 output, state_shape, action_shape, {
+                     'source': os.path.abspath(path),
+                     'policy': type(actor).__name__,
+                     'hidden_activation': args.hidden_activation,
+                     'quantized': args.quantize,
+                 })
+
+    # The exported module has to reproduce the eager actor (up to int8 rounding)
+    module, meta = load_exported_actor(output)
+    states = torch.randn(64, *state_shape)
+    with torch.no_grad():
+        error = (module(states) - actor(states)).abs().max().item()
+    print(f"Exported {meta['policy']} {meta['state_shape']} -> {meta['action_shape']} to {output}")
+    print(f"max |action| difference: {error:.3e}")
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(
+        description="Export actor.pth as a self-contained TorchScript module.")
+    p.add_argument('--actor', type=str, required=True, help='actor.pth or the directory holding it')
+    p.add_argument('--output', type=str, default=None,
+                   help='output file (defaults to actor.pt next to actor.pth)')
+    p.add_argument('--hidden_activation', type=str, default='tanh', choices=['tanh', 'relu'],
+                   help='tanh for PPO/GAIL/AIRL actors, relu for SAC')
+    p.add_argument('--quantize', action='store_true',
+                   help='export with dynamically quantized int8 Linear layers')
+    args = p.parse_args()
+    run(args)
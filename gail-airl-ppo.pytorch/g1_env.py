@@ -1,11 +1,78 @@
 import os
+import copy
+import hashlib
+import tempfile
+from functools import lru_cache
 import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
 import mujoco
 
+from g1_reward import REWARD_DTYPE, compute_reward_terms, reward_weights
+
 # Get base directory for consistent file references
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "data/g1_robot/g1_23dof_simplified.xml")
+MODEL_ASSET_DIR = os.path.join(BASE_DIR, "data/g1_robot/assets")
+MODEL_CACHE_DIR = os.path.join(BASE_DIR, "data/g1_robot/cache")
+
+# Physics overrides applied to the compiled model (part of the cache key)
+GEOM_FRICTION = (1.0, 0.1, 0.1)  # Sliding, torsional, rolling friction
+
+
+def _configure_model(model):
+    """Apply the physics overrides G1Env relies on to a freshly compiled model"""
+    # Increase friction to prevent slipping
+    model.geom_friction[:] = GEOM_FRICTION
+
+
+@lru_cache(maxsize=None)
+def _model_cache_key():
+    """Hash of the XML, its mesh assets, the overrides and the MuJoCo version"""
+    digest = hashlib.sha256()
+    digest.update(mujoco.__version__.encode())
+    digest.update(repr(GEOM_FRICTION).encode())
+    with open(MODEL_PATH, 'rb') as f:
+        digest.update(f.read())
+    for name in sorted(os.listdir(MODEL_ASSET_DIR)):
+        digest.update(name.encode())
+        with open(os.path.join(MODEL_ASSET_DIR, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def load_g1_model(use_cache=True):
+    """
+    Load the fully configured G1 MjModel.
+
+    The first call compiles the XML (parsing all STL meshes), applies the
+    physics overrides and stores the result as a binary MJB file in
+    MODEL_CACHE_DIR. Later calls load that file directly. The cache file name
+    contains a hash of its inputs, so editing the XML, the assets or the
+    overrides (or upgrading MuJoCo) produces a fresh cache entry.
+    """
+    if not use_cache:
+        model = mujoco.MjModel.from_xml_path(MODEL_PATH)
+        _configure_model(model)
+        return model
+
+    cache_path = os.path.join(
+        MODEL_CACHE_DIR, f"g1_23dof_simplified-{_model_cache_key()}.mjb")
+    if os.path.exists(cache_path):
+        return mujoco.MjModel.from_binary_path(cache_path)
+
+    model = load_g1_model(use_cache=False)
+    try:
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        # Write to a temporary file first so concurrent workers never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=MODEL_CACHE_DIR, suffix='.mjb.tmp')
+        os.close(fd)
+        mujoco.mj_saveModel(model, tmp_path, None)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Warning: could not write model cache {cache_path}: {e}")
+    return model
+
 
 class G1Env(gym.Env):
     """
@@ -13,7 +80,8 @@ class G1Env(gym.Env):
     """
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 30}
 
-    def __init__(self, render_mode=None):
+    def __init__(self, render_mode=None, model=None, verbose=True, reset_pool_size=0,
+                 reset_pool_seed=0):
         # Env parameters
         self.frame_skip = 5
         self.goal_pos = np.array([0.0, 0.28, 0.0])  # Set Y to 0.28m ahead
@@ -36,17 +104,20 @@ class G1Env(gym.Env):
         # Tracking variables
         self.steps = 0
         self.render_mode = render_mode
+        self.verbose = verbose
         
-        # Load the model
-        model_path = os.path.join(BASE_DIR, "data/g1_robot/g1_23dof_simplified.xml")
-        self.model = mujoco.MjModel.from_xml_path(model_path)
+        # Load the model (or share one from load_g1_model passed in, e.g. by G1VecEnv)
+        if model is None:
+            model = load_g1_model()
+        self.model = model
         self.data = mujoco.MjData(self.model)
         
         # Get the actual dimensions from the model
         self.qpos_dim = self.model.nq
         self.qvel_dim = self.model.nv
         
-        print(f"Loaded model with qpos dimension: {self.qpos_dim}, qvel dimension: {self.qvel_dim}")
+        if self.verbose:
+            print(f"Loaded model with qpos dimension: {self.qpos_dim}, qvel dimension: {self.qvel_dim}")
         
         # Define action space (joint angle changes) - reduced scale for stability
         n_dof = 23
@@ -57,13 +128,38 @@ class G1Env(gym.Env):
         # Define observation space based on our trimmed observation (23 joint angles + 23 velocities)
         # This matches the expert data dimensions
         obs_dim = 46  # 23 joint angles + 23 velocities
-        print(f"Using observation dimension: {obs_dim} (trimmed to match expert data)")
+        if self.verbose:
+            print(f"Using observation dimension: {obs_dim} (trimmed to match expert data)")
         
         high = np.ones(obs_dim, dtype=np.float32) * np.finfo(np.float32).max
         self.observation_space = spaces.Box(
             low=-high, high=high, dtype=np.float32
         )
         
+        # Resolve body/site ids and joint slices once, so step() does no name lookups
+        self._torso_id = mujoco.mj_name2id(self.model, mujoco.mjtObj.mjOBJ_BODY, "torso")
+        self._left_foot_id = mujoco.mj_name2id(self.model, mujoco.mjtObj.mjOBJ_SITE, "left_foot")
+        self._right_foot_id = mujoco.mj_name2id(self.model, mujoco.mjtObj.mjOBJ_SITE, "right_foot")
+        # Actions drive the last 23 qpos entries, but never the 7 root values
+        joint_start_idx = max(7, self.qpos_dim - n_dof)
+        self._act_qpos = slice(joint_start_idx, joint_start_idx + n_dof)
+        # Observations are the last 23 joint angles and velocities
+        self._obs_qpos = slice(max(0, self.qpos_dim - 23), self.qpos_dim)
+        self._obs_qvel = slice(max(0, self.qvel_dim - 23), self.qvel_dim)
+        n_obs_qpos = self._obs_qpos.stop - self._obs_qpos.start
+        
+        # Reusable buffers. Observations alternate between two slots so that the
+        # previous observation stays valid while the next one is written.
+        self._obs_bufs = np.zeros((2, n_obs_qpos + self._obs_qvel.stop - self._obs_qvel.start),
+                                  dtype=np.float32)
+        self._obs_slot = 0
+        self._obs_split = n_obs_qpos
+        self._action = np.zeros(n_dof, dtype=np.float32)
+        self._scratch = np.zeros(n_dof, dtype=np.float32)
+        self._prev_root_pos = np.zeros(3)
+        self._reward_terms = np.zeros(1, dtype=REWARD_DTYPE)
+        self._reward_weights = reward_weights(self)
+        
         # Set up rendering
         self.viewer = None
         
@@ -74,6 +170,15 @@ class G1Env(gym.Env):
         # For seeding
         self.np_random = np.random.RandomState()
         self.initial_height = None
+        
+        # Optional bank of initial states: reset() then restores one of
+        # reset_pool_size states instead of drawing fresh joint noise.
+        # The pool is built once, lazily, from reset_pool_seed alone, so every
+        # env with the same pool arguments holds the same states; seeds passed
+        # to seed()/reset() only change which of them are picked.
+        self.reset_pool_size = reset_pool_size
+        self.reset_pool_seed = reset_pool_seed
+        self._reset_pool = None
     
     def seed(self, seed=None):
         self.np_random.seed(seed)
@@ -97,54 +202,35 @@ class G1Env(gym.Env):
         self.renderer = mujoco.Renderer(self.model)
     
     def _get_obs(self):
-        """Get the current observation"""
-        # Get joint positions (qpos) and velocities (qvel)
-        qpos = self.data.qpos.copy()
-        qvel = self.data.qvel.copy()
+        """Get the current observation
         
-        # Clip velocities to prevent extreme values
-        qvel = np.clip(qvel, -10.0, 10.0)
+        The returned array is one of two reusable buffers: it stays valid until
+        the next-but-one call to step() or reset(). Copy it to keep it longer.
+        """
+        obs = self._obs_bufs[self._obs_slot]
+        self._obs_slot ^= 1
         
         # In MJCF, qpos includes:
         # - 3 values for the root position (x, y, z)
         # - 4 values for the root orientation (quaternion)
         # - The rest are joint angles
-        # We only want the joint angles (last 23 elements) to match expert data
-        if len(qpos) > 23:
-            qpos_joints = qpos[-23:]  # Take only the last 23 joint values
-        else:
-            qpos_joints = qpos  # Keep all if already right size
-            
-        # Similarly for qvel
-        if len(qvel) > 23:
-            qvel_joints = qvel[-23:]  # Take only the last 23 velocity values
-        else:
-            qvel_joints = qvel  # Keep all if already right size
-        
-        # Concatenate to get the full state and convert to float32
-        obs = np.concatenate([qpos_joints, qvel_joints]).astype(np.float32)
+        # We only want the joint angles (last 23 elements) to match expert data,
+        # and the matching velocities clipped to prevent extreme values
+        obs[:self._obs_split] = self.data.qpos[self._obs_qpos]
+        np.clip(self.data.qvel[self._obs_qvel], -10.0, 10.0, out=obs[self._obs_split:])
         
-        # Replace any NaN or Inf values with zeros
-        obs = np.nan_to_num(obs, nan=0.0, posinf=0.0, neginf=0.0)
+        # Replace any NaN or Inf values with zeros (the sum is only non-finite if some entry is)
+        if not np.isfinite(obs.sum()):
+            np.nan_to_num(obs, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
         
         return obs
         
-    def reset(self, seed=None, options=None):
-        """Reset the environment to a random initial state"""
-        if seed is not None:
-            self.seed(seed)
-        
+    def _randomize_initial_state(self):
+        """Put the robot in its XML pose with slightly perturbed joints (not forwarded)"""
         # Reset the simulation and preserve root position & orientation from XML
         mujoco.mj_resetData(self.model, self.data)
         
-        # Increase friction to prevent slipping
-        # Find and modify friction parameters for the floor
-        for i in range(self.model.ngeom):
-            if self.model.geom_solref is not None and i < len(self.model.geom_solref):
-                # Increase friction coefficient
-                self.model.geom_friction[i, 0] = 1.0  # Sliding friction
-                self.model.geom_friction[i, 1] = 0.1  # Torsional friction
-                self.model.geom_friction[i, 2] = 0.1  # Rolling friction
+        # Friction overrides are already part of the model (see load_g1_model)
         
         # Neutralize only joint DOFs (preserve first 7 qpos for root)
         n_root = 7  # 3 for root pos, 4 for root quaternion
@@ -154,18 +240,48 @@ class G1Env(gym.Env):
         # Add a small amount of noise to joint positions for exploration
         joint_noise = self.np_random.uniform(-0.01, 0.01, size=self.qpos_dim-n_root)
         self.data.qpos[n_root:] += joint_noise
+
+    def _build_reset_pool(self):
+        """Pre-generate reset_pool_size initial states from reset_pool_seed"""
+        # A separate RNG leaves np_random untouched, so reset(seed=s) picks
+        # the same state whether or not it is the reset that built the pool.
+        np_random = self.np_random
+        self.np_random = np.random.RandomState(self.reset_pool_seed)
+        spec = mujoco.mjtState.mjSTATE_INTEGRATION
+        self._reset_pool = np.zeros((self.reset_pool_size, mujoco.mj_stateSize(self.model, spec)))
+        for state in self._reset_pool:
+            self._randomize_initial_state()
+            mujoco.mj_getState(self.model, self.data, state, spec)
+        self.np_random = np_random
+
+    def reset(self, seed=None, options=None):
+        """Reset the environment to a random initial state"""
+        if seed is not None:
+            self.seed(seed)
         
-        # Forward dynamics to get the simulation into a valid state
-        mujoco.mj_forward(self.model, self.data)
+        if self.reset_pool_size > 0:
+            # Restore a pre-generated state picked with the env's RNG
+            if self._reset_pool is None:
+                self._build_reset_pool()
+            state = self._reset_pool[self.np_random.randint(self.reset_pool_size)]
+            mujoco.mj_setState(self.model, self.data, state, mujoco.mjtState.mjSTATE_INTEGRATION)
+            # Only the position/velocity stages are needed: step() starts with mj_step2,
+            # which recomputes everything else (bit-identical to a full mj_forward)
+            mujoco.mj_step1(self.model, self.data)
+        else:
+            self._randomize_initial_state()
+            # Forward dynamics to get the simulation into a valid state
+            mujoco.mj_forward(self.model, self.data)
         
         # Store initial height for comparison
         self.initial_height = self.data.qpos[2]
         
         # Set goal position (slightly away from initial position)
-        self.torso_pos = self.data.xpos[mujoco.mj_name2id(self.model, mujoco.mjtObj.mjOBJ_BODY, "torso")].copy()
+        self.torso_pos = self.data.xpos[self._torso_id].copy()
         # self.goal_pos = np.array([0.0, 0.4, 0.0])  # Set Y to 0.4m ahead (changed from 0.5)
         self.goal_pos = np.array([0.25, 0.0, 0.0]) # Set X to 0.25m ahead (side stepping is in x-axis)
-        print(f"Setting goal at y={self.goal_pos[1]:.2f} (initial y={self.torso_pos[1]:.2f})")
+        if self.verbose:
+            print(f"Setting goal at y={self.goal_pos[1]:.2f} (initial y={self.torso_pos[1]:.2f})")
         
         # Reset tracking variables
         self.steps = 0
@@ -181,137 +297,104 @@ class G1Env(gym.Env):
         
         return obs, info
 
-    def step(self, action):
-        """Step the simulation forward based on the action"""
-        self.steps += 1
-        
+    def _apply_action(self, action):
+        """Smooth the scaled action and add it to the joint positions; returns the jerk penalty"""
         # Scale and clip action for stability
-        action = np.clip(action, -1.0, 1.0) * self.action_scale
+        act = self._action
+        np.clip(action, -1.0, 1.0, out=act)
+        act *= self.action_scale
 
         # —— ADDED SMOOTHING BLOCK ——
         alpha = 0.6
-        action = alpha * self.prev_action + (1 - alpha) * action
-        self.prev_action = action.copy()
+        act *= 1 - alpha
+        np.multiply(self.prev_action, alpha, out=self._scratch)
+        act += self._scratch
+        self.prev_action[:] = act
         # ————————————————————————
 
-        # We can only control the actual joint DOFs, not the root position/orientation
-        # Skip the first 7 qpos values (3 for position, 4 for quaternion orientation)
-        # and apply action to the last 23 joint values (if model has more)
-        joint_start_idx = self.qpos_dim - 23  # Calculate where the last 23 joints start
-        joint_start_idx = max(7, joint_start_idx)  # Ensure we're at least past the root
-        
-        # Apply actions to the joints
-        n_action = min(len(action), 23)  # We expect 23 actions
-        
-        # Record root position before simulation for reward calculation
-        prev_root_pos = self.data.qpos[:3].copy()
-        
-        # Apply actions with more careful stepping
-        for i in range(n_action):
-            self.data.qpos[joint_start_idx + i] += action[i]
+        # We can only control the actual joint DOFs, not the root position/orientation:
+        # the action is added to the last 23 joint values (see _act_qpos)
+        qpos_joints = self.data.qpos[self._act_qpos]
+        qpos_joints += act
         
         # Add joint limit constraint to prevent extreme values
         joint_limits = 3.14  # approx pi, reasonable joint limit in radians
-        self.data.qpos[joint_start_idx:joint_start_idx+n_action] = np.clip(
-            self.data.qpos[joint_start_idx:joint_start_idx+n_action],
-            -joint_limits, joint_limits
-        )
+        np.clip(qpos_joints, -joint_limits, joint_limits, out=qpos_joints)
 
-        jerk_penalty = 0.1 * np.sum((action - self.prev_action)**2)
+        np.subtract(act, self.prev_action, out=self._scratch)
+        return 0.1 * np.dot(self._scratch, self._scratch)
+
+    def _simulate(self):
+        """Run frame_skip physics substeps"""
+        qpos = self.data.qpos
+        for _ in range(self.frame_skip):  # Take more smaller steps 
+            # Check if state is valid before stepping (the sum is only non-finite if some entry is)
+            if not np.isfinite(qpos.sum()):
+                print("Warning: Invalid state detected (NaN/Inf in qpos)")
+                # Reset to previous valid state
+                np.nan_to_num(qpos, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+                
+            # Step with smaller timestep for stability
+            mujoco.mj_step2(self.model, self.data)  # Just run kinematics
+            
+            # Add damping to velocities for stability
+            self.data.qvel[:] *= 0.99  # Slight damping
+            
+            # Run dynamics
+            mujoco.mj_step1(self.model, self.data)
+
+    def step(self, action):
+        """Step the simulation forward based on the action"""
+        jerk_penalty = self._begin_step(action)
         
         # Run the simulation with smaller steps for better stability
         try:
-            for _ in range(self.frame_skip):  # Take more smaller steps 
-                # Check if state is valid before stepping
-                if np.any(np.isnan(self.data.qpos)) or np.any(np.isinf(self.data.qpos)):
-                    print("Warning: Invalid state detected (NaN/Inf in qpos)")
-                    # Reset to previous valid state
-                    self.data.qpos[:] = np.nan_to_num(self.data.qpos, nan=0.0, posinf=0.0, neginf=0.0)
-                    
-                # Step with smaller timestep for stability
-                mujoco.mj_step2(self.model, self.data)  # Just run kinematics
-                
-                # Add damping to velocities for stability
-                self.data.qvel[:] *= 0.99  # Slight damping
-                
-                # Run dynamics
-                mujoco.mj_step1(self.model, self.data)
+            self._simulate()
         except Exception as e:
             print(f"Simulation error: {e}")
             # Return early with terminated=True if simulation fails
             return self._get_obs(), 0.0, True, False, {"error": str(e)}
 
+        return self._end_step(jerk_penalty)
+
+    def _begin_step(self, action):
+        """Everything before the physics substeps; returns the jerk penalty"""
+        self.steps += 1
+        
+        # Record root position before simulation for reward calculation
+        self._prev_root_pos[:] = self.data.qpos[:3]
+        
+        return self._apply_action(action)
+
+    def _end_step(self, jerk_penalty):
+        """Everything after the physics substeps: observation, reward and termination"""
+        prev_root_pos = self._prev_root_pos
+
         # Get the new observation
         obs = self._get_obs()
 
         # Get state information
-        root_pos = self.data.qpos[:3].copy()
+        qpos = self.data.qpos
+        root_pos = qpos[:3]
         root_height = root_pos[2]
         
         # Get position of the torso/body (more reliable than root for goal distance)
-        torso_id = mujoco.mj_name2id(self.model, mujoco.mjtObj.mjOBJ_BODY, "torso")
-        if torso_id >= 0:
+        if self._torso_id >= 0:
             # Get position of torso
-            torso_pos = self.data.xpos[torso_id].copy()
+            torso_pos = self.data.xpos[self._torso_id]
         else:
             # Fallback to root position if torso not found
             torso_pos = root_pos
         
-        # --- Existing reward components ---
-        # Compute reward based on multiple components
-        # 1. Base survival reward
-        reward = 0.3
-        
-        # 2. Stability reward (positive for staying upright)
-        if root_height > self.stability_height_threshold:
-            stability_reward = self.stability_reward_weight
-        else:
-            stability_reward = root_height / self.stability_height_threshold * self.stability_reward_weight
-        reward += stability_reward
-        
-        # 3. Goal-reaching reward
-        goal_distance = np.linalg.norm(torso_pos[:2] - self.goal_pos[:2])
-        if goal_distance < 0.05:  # Very close to goal - extra bonus
-            goal_reward = self.goal_reward_weight * 2
-        else:
-            goal_reward = self.goal_reward_weight * (1 - min(goal_distance, 1.0))
-        reward += goal_reward
-        # --- End existing components ---
-        
-        ## Penalty for Jerking
-        reward -= jerk_penalty
-        
-        ## Explicit reward for y-direction progress, small and dense feedback
-        # 4. Forward progress
-        y_progress = root_pos[1] - prev_root_pos[1]
-        if y_progress > 0:
-            reward += y_progress * 15.0
-
-        # # Check for goal success (robot is close enough to goal)
-        # goal_success = goal_distance < 0.3  # Increased threshold for 3m goal (was 0.27)
-
-        # --- Added: Step‐size consistency bonus/penalty ---
-        step_dev = y_progress - self.desired_step_size
-        reward -= self.step_penalty_weight * abs(step_dev)
-        # --- End added ---
-
-        # --- Added: Torso‐tilt penalty ---
-        # Use root quaternion (qpos[3:7]) to compute tilt angle
-        w, x, y, z = self.data.qpos[3:7]
-        # Rotation matrix element Rzz = 1 - 2*(x^2 + y^2)
-        Rzz = 1 - 2*(x*x + y*y)
-        tilt_angle = np.arccos(np.clip(Rzz, -1.0, 1.0))
-        reward -= self.tilt_penalty_weight * tilt_angle
-        # --- End added ---
-
-        # --- Added: Lateral‐stepping bonus ---
-        left_sid = mujoco.mj_name2id(self.model, mujoco.mjtObj.mjOBJ_SITE, "left_foot")
-        right_sid = mujoco.mj_name2id(self.model, mujoco.mjtObj.mjOBJ_SITE, "right_foot")
-        left_xy  = self.data.site_xpos[left_sid]
-        right_xy = self.data.site_xpos[right_sid]
-        lateral_disp = abs(left_xy[0] - right_xy[0])
-        reward += self.lateral_reward_weight * lateral_disp
-        # --- End added ---
+        # Reward from the kernel shared with G1VecEnv and relabel_rewards.py,
+        # on a batch of one
+        site_xpos = self.data.site_xpos
+        terms = compute_reward_terms(
+            root_pos[None], qpos[None, 3:7], prev_root_pos[None], torso_pos[None],
+            site_xpos[None, self._left_foot_id], site_xpos[None, self._right_foot_id],
+            self.goal_pos, jerk_penalty, self._reward_weights, out=self._reward_terms)[0]
+        reward = terms['total']
+        goal_distance = terms['goal_distance']
         
         # Check for termination (robot fell or reached goal)
         fall = root_height < self.fall_threshold
@@ -323,10 +406,10 @@ class G1Env(gym.Env):
         
         # Additional info
         info = {
-            'reward_stability': stability_reward,
-            'reward_goal': goal_reward,
+            'reward_stability': terms['stability'],
+            'reward_goal': terms['goal'],
             'root_height': root_height,
-            'torso_pos': torso_pos,
+            'torso_pos': torso_pos.copy(),
             'goal_distance': goal_distance,
             'goal_success': goal_success,
             'fall': fall
@@ -365,6 +448,228 @@ class G1Env(gym.Env):
             glfw.terminate()
             self.viewer = None
 
+class RolloutPhysics:
+    """
+    Runs the frame-skip substeps of a batch of G1 robots in native code.
+
+    All N x frame_skip substeps go through one call to MuJoCo's multi-threaded
+    rollout module, so the interpreter is out of the substep loop. The only
+    Python work left per batch step is one mj_getState before the call and
+    one mj_setState and mj_kinematics per robot after it.
+
+    G1Env._simulate scales qvel by velocity_damping after every substep. A
+    native rollout cannot run that line, so the damping is folded into
+    dof_damping of a private model copy instead: the implicitfast integrator
+    applies a damping of (1/velocity_damping - 1) / timestep times the
+    diagonal of the mass matrix (at qpos0) implicitly, which shrinks each
+    velocity by velocity_damping per substep when the mass matrix is diagonal.
+    The divergence check runs once per batch step on the stacked final states.
+
+    Trajectories are close to, but not bit-identical with, the Python loop:
+    the mass matrix is only approximately diagonal, and the loop's first
+    substep starts with mj_step2 on kinematics from before the action changed
+    qpos. test_rollout_backend.py bounds the resulting joint angle difference.
+    """
+
+    def __init__(self, model, num_envs, frame_skip, nthread=None, velocity_damping=0.99):
+        # Needs a MuJoCo version with the rollout module
+        from mujoco import rollout
+
+        self.frame_skip = frame_skip
+        self.spec = mujoco.mjtState.mjSTATE_FULLPHYSICS
+
+        # Express the per-substep velocity damping as joint damping
+        self.model = copy.copy(model)
+        data = mujoco.MjData(self.model)
+        mujoco.mj_forward(self.model, data)
+        mass = np.zeros((self.model.nv, self.model.nv))
+        mujoco.mj_fullM(self.model, data, mass)
+        self.model.dof_damping += (
+            (1.0 / velocity_damping - 1.0) / self.model.opt.timestep * np.diag(mass))
+
+        if nthread is None:
+            nthread = os.cpu_count() or 1
+        self.rollout = rollout.Rollout(nthread=nthread)
+        self.datas = [mujoco.MjData(self.model) for _ in range(max(1, nthread))]
+
+        # Preallocated inputs and outputs
+        nstate = mujoco.mj_stateSize(self.model, self.spec)
+        self.initial_state = np.zeros((num_envs, nstate))
+        self.state = np.zeros((num_envs, frame_skip, nstate))
+        self.control = np.zeros((1, 1, self.model.nu))  # The env never sets ctrl
+
+    def simulate(self, datas):
+        """
+        Advance every MjData in datas by frame_skip substeps. If the native
+        rollout raises, datas are left unchanged and the error propagates.
+        """
+        for data, initial_state in zip(datas, self.initial_state):
+            mujoco.mj_getState(self.model, data, initial_state, self.spec)
+
+        self.rollout.rollout(
+            self.model, self.datas, self.initial_state, self.control,
+            nstep=self.frame_skip, state=self.state)
+
+        final_state = self.state[:, -1]
+        # Check all states at once (a row sum is only non-finite if some entry is)
+        invalid = ~np.isfinite(final_state.sum(axis=1))
+        if invalid.any():
+            print(f"Warning: Invalid state detected (NaN/Inf) in {invalid.sum()} environments")
+            np.nan_to_num(final_state, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+
+        for data, state in zip(datas, final_state):
+            mujoco.mj_setState(self.model, data, state, self.spec)
+            # Positions of bodies and sites for the reward
+            mujoco.mj_kinematics(self.model, data)
+
+    def close(self):
+        self.rollout.close()
+
+
+class G1VecEnv:
+    """
+    Batched G1 environment: N robots, each with its own MjData, sharing one MjModel.
+
+    step() takes an (N, 23) action array and returns preallocated (N, 46)
+    observations and (N,) reward, terminated and truncated arrays. The arrays
+    are reused between calls, so copy them if you need to keep them around.
+    Sub-environments that finish are reset automatically; the observation that
+    ended their episode is stored in infos['final_obs'], and the per-term
+    reward components (see g1_reward.py) in infos['reward_terms'].
+
+    backend='python' runs each robot's substeps exactly like G1Env.step;
+    backend='rollout' runs the physics of the whole batch natively on nthread
+    threads (see RolloutPhysics).
+    """
+
+    def __init__(self, num_envs, model=None, reset_pool_size=0, backend='python', nthread=None,
+                 reset_pool_seed=0):
+        self.num_envs = num_envs
+
+        # Load the model once and share it across all sub-environments
+        if model is None:
+            model = load_g1_model()
+        self.model = model
+        self.envs = [G1Env(model=model, verbose=False, reset_pool_size=reset_pool_size,
+                           reset_pool_seed=reset_pool_seed)
+                     for _ in range(num_envs)]
+        self.datas = [env.data for env in self.envs]
+
+        if backend == 'rollout':
+            self.physics = RolloutPhysics(model, num_envs, self.envs[0].frame_skip, nthread)
+        elif backend == 'python':
+            self.physics = None
+        else:
+            raise ValueError(f"Unknown physics backend: {backend}")
+
+        # Spaces describe a single sub-environment, like the rest of the code expects
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+        self._max_episode_steps = self.envs[0].episode_length
+
+        # Preallocated outputs
+        obs_dim = self.observation_space.shape[0]
+        self._obs = np.zeros((num_envs, obs_dim), dtype=np.float32)
+        self._final_obs = np.zeros((num_envs, obs_dim), dtype=np.float32)
+        self._rewards = np.zeros(num_envs, dtype=np.float32)
+        self._terminated = np.zeros(num_envs, dtype=bool)
+        self._truncated = np.zeros(num_envs, dtype=bool)
+        self._reward_terms = np.zeros(num_envs, dtype=REWARD_DTYPE)
+        self._infos = {'final_obs': self._final_obs, 'reward_terms': self._reward_terms}
+
+        # Batched inputs of the reward kernel, gathered from the sub-environments
+        self._reward_weights = reward_weights(self.envs[0])
+        self._jerk = np.zeros(num_envs)
+        self._failed = np.zeros(num_envs, dtype=bool)
+        self._root_pos = np.zeros((num_envs, 3))
+        self._root_quat = np.zeros((num_envs, 4))
+        self._prev_root_pos = np.zeros((num_envs, 3))
+        self._torso_pos = np.zeros((num_envs, 3))
+        self._left_foot_pos = np.zeros((num_envs, 3))
+        self._right_foot_pos = np.zeros((num_envs, 3))
+        self._goal_pos = np.zeros((num_envs, 3))
+        self._steps = np.zeros(num_envs, dtype=np.int64)
+
+    def seed(self, seed=None):
+        for i, env in enumerate(self.envs):
+            env.seed(None if seed is None else seed + i)
+        return [seed]
+
+    def reset(self, seed=None, options=None):
+        """Reset every sub-environment and return the stacked observations"""
+        if seed is not None:
+            self.seed(seed)
+        for i, env in enumerate(self.envs):
+            self._obs[i], _ = env.reset()
+        return self._obs, {}
+
+    def step(self, actions):
+        """Step all sub-environments with an (N, 23) action array"""
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            self._jerk[i] = env._begin_step(action)
+
+        self._failed[:] = False
+        if self.physics is None:
+            for i, env in enumerate(self.envs):
+                try:
+                    env._simulate()
+                except Exception as e:
+                    print(f"Simulation error: {e}")
+                    self._failed[i] = True
+        else:
+            try:
+                self.physics.simulate(self.datas)
+            except Exception as e:
+                # The rollout covers the whole batch, so every robot's step
+                # failed; they all end their episode and are reset below.
+                print(f"Simulation error: {e}")
+                self._failed[:] = True
+
+        # Gather what the reward depends on and compute it for all robots at once
+        for i, (env, data) in enumerate(zip(self.envs, self.datas)):
+            qpos = data.qpos
+            self._root_pos[i] = qpos[:3]
+            self._root_quat[i] = qpos[3:7]
+            self._prev_root_pos[i] = env._prev_root_pos
+            self._torso_pos[i] = data.xpos[env._torso_id] if env._torso_id >= 0 else qpos[:3]
+            self._left_foot_pos[i] = data.site_xpos[env._left_foot_id]
+            self._right_foot_pos[i] = data.site_xpos[env._right_foot_id]
+            self._goal_pos[i] = env.goal_pos
+            self._steps[i] = env.steps
+            self._obs[i] = env._get_obs()
+
+        terms = compute_reward_terms(
+            self._root_pos, self._root_quat, self._prev_root_pos, self._torso_pos,
+            self._left_foot_pos, self._right_foot_pos, self._goal_pos,
+            self._jerk, self._reward_weights, out=self._reward_terms)
+        self._rewards[:] = terms['total']
+
+        # Fall or goal reached, or maximum episode length exceeded
+        env = self.envs[0]
+        np.less(self._root_pos[:, 2], env.fall_threshold, out=self._terminated)
+        self._terminated |= terms['goal_distance'] < env.goal_success_threshold
+        np.greater_equal(self._steps, env.episode_length, out=self._truncated)
+
+        # Robots whose simulation raised end their episode without reward
+        if self._failed.any():
+            self._rewards[self._failed] = 0.0
+            self._terminated[self._failed] = True
+            self._truncated[self._failed] = False
+
+        # Keep the last observation and start a new episode
+        for i in np.flatnonzero(self._terminated | self._truncated):
+            self._final_obs[i] = self._obs[i]
+            self._obs[i], _ = self.envs[i].reset()
+
+        return self._obs, self._rewards, self._terminated, self._truncated, self._infos
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+        if self.physics is not None:
+            self.physics.close()
+
+
 class GymCompatibilityWrapper:
     """Wrapper to handle API differences between the old Gym and new Gymnasium"""
     def __init__(self, env):
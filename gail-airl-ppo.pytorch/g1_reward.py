@@ -0,0 +1,102 @@
+import numpy as np
+
+# Reward hyperparameters, named like the G1Env attributes they mirror
+DEFAULT_REWARD_WEIGHTS = {
+    'survival_reward': 0.3,
+    'stability_reward_weight': 0.8,
+    'stability_height_threshold': 0.5,
+    'goal_reward_weight': 10.0,
+    'progress_reward_weight': 15.0,
+    'desired_step_size': 0.2,
+    'step_penalty_weight': 5.0,
+    'tilt_penalty_weight': 2.0,
+    'lateral_reward_weight': 3.0,
+}
+
+# Signed contribution of every reward term; 'total' is their sum.
+# goal_distance is not a reward term but is needed for termination.
+REWARD_TERMS = ('survival', 'stability', 'goal', 'jerk', 'progress',
+                'step_size', 'tilt', 'lateral')
+REWARD_DTYPE = np.dtype([(name, np.float64) for name in REWARD_TERMS + ('total', 'goal_distance')])
+
+
+def reward_weights(env=None, **overrides):
+    """
+    Reward hyperparameters of env (or the defaults), with overrides applied.
+    """
+    weights = dict(DEFAULT_REWARD_WEIGHTS)
+    if env is not None:
+        for key in weights:
+            weights[key] = getattr(env, key, weights[key])
+    for key, value in overrides.items():
+        if key not in weights:
+            raise KeyError(f"Unknown reward weight: {key}")
+        weights[key] = value
+    return weights
+
+
+def compute_reward_terms(root_pos, root_quat, prev_root_pos, torso_pos,
+                         left_foot_pos, right_foot_pos, goal_pos,
+                         jerk_penalty=0.0, weights=None, out=None):
+    """
+    G1Env reward for a batch of simulator states.
+
+    Positions are (N, 3) arrays, root_quat is (N, 4) in MuJoCo's (w, x, y, z)
+    order and goal_pos is (3,) or (N, 3). Returns an (N,) structured array
+    with the dtype REWARD_DTYPE. G1Env (with a batch of one), G1VecEnv and
+    relabel_rewards.py all compute their rewards here.
+    """
+    if weights is None:
+        weights = DEFAULT_REWARD_WEIGHTS
+    root_pos = np.asarray(root_pos, dtype=np.float64)
+    root_quat = np.asarray(root_quat, dtype=np.float64)
+    torso_pos = np.asarray(torso_pos, dtype=np.float64)
+    goal_pos = np.asarray(goal_pos, dtype=np.float64)
+    if out is None:
+        out = np.empty(len(root_pos), dtype=REWARD_DTYPE)
+
+    # 1. Base survival reward
+    out['survival'] = weights['survival_reward']
+
+    # 2. Stability reward, scaled down below the height threshold
+    root_height = root_pos[:, 2]
+    threshold = weights['stability_height_threshold']
+    stability_weight = weights['stability_reward_weight']
+    out['stability'] = np.where(
+        root_height > threshold, stability_weight, root_height / threshold * stability_weight)
+
+    # 3. Goal-reaching reward, with a bonus very close to the goal
+    dx = torso_pos[:, 0] - goal_pos[..., 0]
+    dy = torso_pos[:, 1] - goal_pos[..., 1]
+    goal_distance = np.sqrt(dx * dx + dy * dy)
+    goal_weight = weights['goal_reward_weight']
+    out['goal'] = np.where(
+        goal_distance < 0.05, goal_weight * 2, goal_weight * (1 - np.minimum(goal_distance, 1.0)))
+    out['goal_distance'] = goal_distance
+
+    # Penalty for jerking
+    out['jerk'] = -np.asarray(jerk_penalty, dtype=np.float64)
+
+    # 4. Forward progress along y (only rewarded when positive)
+    y_progress = root_pos[:, 1] - np.asarray(prev_root_pos, dtype=np.float64)[:, 1]
+    out['progress'] = np.where(y_progress > 0, y_progress * weights['progress_reward_weight'], 0.0)
+
+    # Step-size consistency penalty
+    out['step_size'] = -(weights['step_penalty_weight']
+                         * np.abs(y_progress - weights['desired_step_size']))
+
+    # Torso-tilt penalty, from Rzz = 1 - 2*(x^2 + y^2) of the root quaternion
+    x = root_quat[:, 1]
+    y = root_quat[:, 2]
+    Rzz = 1 - 2 * (x * x + y * y)
+    out['tilt'] = -(weights['tilt_penalty_weight'] * np.arccos(np.clip(Rzz, -1.0, 1.0)))
+
+    # Lateral-stepping bonus
+    lateral_disp = np.abs(np.asarray(left_foot_pos)[:, 0] - np.asarray(right_foot_pos)[:, 0])
+    out['lateral'] = weights['lateral_reward_weight'] * lateral_disp
+
+    total = out['total']
+    total[:] = out['survival']
+    for name in REWARD_TERMS[1:]:
+        total += out[name]
+    return out
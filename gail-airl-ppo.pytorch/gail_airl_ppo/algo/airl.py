@@ -4,6 +4,7 @@ import torch.nn.functional as F
 from torch.optim import Adam
 
 from .ppo import PPO
+from gail_airl_ppo.buffer import PrefetchSampler
 from gail_airl_ppo.network import AIRLDiscrim
 
 
@@ -15,11 +16,14 @@ class AIRL(PPO):
                  units_actor=(64, 64), units_critic=(64, 64),
                  units_disc_r=(100, 100), units_disc_v=(100, 100),
                  epoch_ppo=50, epoch_disc=10, clip_eps=0.2, lambd=0.97,
-                 coef_ent=0.0, max_grad_norm=10.0):
+                 coef_ent=0.0, max_grad_norm=10.0,
+                 num_minibatches=1, minibatch_size=None, target_kl=None,
+                 prefetch_depth=0):
         super().__init__(
             state_shape, action_shape, device, seed, gamma, rollout_length,
             mix_buffer, lr_actor, lr_critic, units_actor, units_critic,
-            epoch_ppo, clip_eps, lambd, coef_ent, max_grad_norm
+            epoch_ppo, clip_eps, lambd, coef_ent, max_grad_norm,
+            num_minibatches, minibatch_size, target_kl
         )
 
         # Expert's buffer.
@@ -40,18 +44,28 @@ class AIRL(PPO):
         self.batch_size = batch_size
         self.epoch_disc = epoch_disc
 
+        # Discriminator minibatches, gathered in the background.
+        self.sampler = self.sampler_exp = None
+        if prefetch_depth > 0:
+            self.sampler = PrefetchSampler(
+                self.buffer, batch_size, prefetch_depth, seed)
+            self.sampler_exp = PrefetchSampler(
+                buffer_exp, batch_size, prefetch_depth, seed + 1)
+
     def update(self, writer):
         self.learning_steps += 1
+        if self.sampler is not None:
+            # The rollout buffer was refilled since the last update.
+            self.sampler.reset(self.epoch_disc)
 
         for _ in range(self.epoch_disc):
             self.learning_steps_disc += 1
 
-            # Samples from current policy's trajectories.
-            states, _, _, dones, log_pis, next_states = \
-                self.buffer.sample(self.batch_size)
-            # Samples from expert's demonstrations.
-            states_exp, actions_exp, _, dones_exp, next_states_exp = \
-                self.buffer_exp.sample(self.batch_size)
+            # Samples from current policy's trajectories and from
+            # expert's demonstrations.
+            batch, batch_exp = self.sample_disc()
+            states, _, _, dones, log_pis, next_states = batch
+            states_exp, actions_exp, _, dones_exp, next_states_exp = batch_exp
             # Calculate log probabilities of expert actions.
             with torch.no_grad():
                 log_pis_exp = self.actor.evaluate_log_pi(
@@ -73,6 +87,12 @@ class AIRL(PPO):
         self.update_ppo(
             states, actions, rewards, dones, log_pis, next_states, writer)
 
+    def sample_disc(self):
+        if self.sampler is None:
+            return (self.buffer.sample(self.batch_size),
+                    self.buffer_exp.sample(self.batch_size))
+        return self.sampler.sample(), self.sampler_exp.sample()
+
     def update_disc(self, states, dones, log_pis, next_states,
                     states_exp, dones_exp, log_pis_exp,
                     next_states_exp, writer):
@@ -6,6 +6,9 @@ import torch
 
 class Algorithm(ABC):
 
+    # Host tensor that batches of observations are copied into
+    _staging = None
+
     def __init__(self, state_shape, action_shape, device, seed, gamma):
         np.random.seed(seed)
         torch.manual_seed(seed)
@@ -35,6 +38,35 @@ class Algorithm(ABC):
             action = self.actor(state.unsqueeze_(0))
         return action.cpu().numpy()[0]
 
+    def explore_batch(self, states):
+        """
+        Sample actions for an (N, obs_dim) batch of observations with one
+        forward pass. Returns (N, act_dim) actions and (N, 1) log-probs.
+        """
+        with torch.inference_mode():
+            actions, log_pis = self.actor.sample(self._stage(states))
+        return actions.cpu().numpy(), log_pis.cpu().numpy()
+
+    def exploit_batch(self, states):
+        """Deterministic (N, act_dim) actions for (N, obs_dim) observations"""
+        with torch.inference_mode():
+            actions = self.actor(self._stage(states))
+        return actions.cpu().numpy()
+
+    def _stage(self, states):
+        # Copy the observations into a reused host tensor (pinned when the
+        # actor is on the GPU, so the transfer can be asynchronous).
+        states = torch.from_numpy(np.asarray(states, dtype=np.float32))
+        n = states.size(0)
+        if self._staging is None or self._staging.size(0) < n \
+                or self._staging.shape[1:] != states.shape[1:]:
+            self._staging = torch.empty(
+                states.shape, dtype=torch.float,
+                pin_memory=self.device.type == 'cuda')
+        staging = self._staging[:n]
+        staging.copy_(states)
+        return staging.to(self.device, non_blocking=True)
+
     @abstractmethod
     def is_update(self, step):
         pass
@@ -5,6 +5,7 @@ import torch.nn.functional as F
 from torch.optim import Adam
 
 from .ppo import PPO
+from gail_airl_ppo.buffer import PrefetchSampler
 from gail_airl_ppo.network import GAILDiscrim
 
 
@@ -15,11 +16,14 @@ class GAIL(PPO):
                  batch_size=64, lr_actor=1e-4, lr_critic=1e-4, lr_disc=1e-4,
                  units_actor=(64, 64), units_critic=(64, 64),
                  units_disc=(100, 100), epoch_ppo=50, epoch_disc=10,
-                 clip_eps=0.2, lambd=0.97, coef_ent=0.01, max_grad_norm=1.0):
+                 clip_eps=0.2, lambd=0.97, coef_ent=0.01, max_grad_norm=1.0,
+                 num_minibatches=1, minibatch_size=None, target_kl=None,
+                 prefetch_depth=0):
         super().__init__(
             state_shape, action_shape, device, seed, gamma, rollout_length,
             mix_buffer, lr_actor, lr_critic, units_actor, units_critic,
-            epoch_ppo, clip_eps, lambd, coef_ent, max_grad_norm
+            epoch_ppo, clip_eps, lambd, coef_ent, max_grad_norm,
+            num_minibatches, minibatch_size, target_kl
         )
 
         # Expert's buffer.
@@ -38,17 +42,28 @@ class GAIL(PPO):
         self.batch_size = batch_size
         self.epoch_disc = epoch_disc
 
+        # Discriminator minibatches, gathered in the background.
+        self.sampler = self.sampler_exp = None
+        if prefetch_depth > 0:
+            self.sampler = PrefetchSampler(
+                self.buffer, batch_size, prefetch_depth, seed)
+            self.sampler_exp = PrefetchSampler(
+                buffer_exp, batch_size, prefetch_depth, seed + 1)
+
     def update(self, writer):
         self.learning_steps += 1
+        if self.sampler is not None:
+            # The rollout buffer was refilled since the last update.
+            self.sampler.reset(self.epoch_disc)
 
         for _ in range(self.epoch_disc):
             self.learning_steps_disc += 1
 
-            # Samples from current policy's trajectories.
-            states, actions = self.buffer.sample(self.batch_size)[:2]
-            # Samples from expert's demonstrations.
-            states_exp, actions_exp = \
-                self.buffer_exp.sample(self.batch_size)[:2]
+            # Samples from current policy's trajectories and from
+            # expert's demonstrations.
+            batch, batch_exp = self.sample_disc()
+            states, actions = batch[:2]
+            states_exp, actions_exp = batch_exp[:2]
             
             # Check for NaN or inf in states and actions before updating
             if (torch.isnan(states).any() or torch.isinf(states).any() or
@@ -91,6 +106,12 @@ class GAIL(PPO):
         self.update_ppo(
             states, actions, rewards, dones, log_pis, next_states, writer)
 
+    def sample_disc(self):
+        if self.sampler is None:
+            return (self.buffer.sample(self.batch_size),
+                    self.buffer_exp.sample(self.batch_size))
+        return self.sampler.sample(), self.sampler_exp.sample()
+
     def update_disc(self, states, actions, states_exp, actions_exp, writer):
         # Output of discriminator is (-inf, inf), not [0, 1].
         logits_pi = self.disc(states, actions)
@@ -9,32 +9,73 @@ from gail_airl_ppo.buffer import RolloutBuffer
 from gail_airl_ppo.network import StateIndependentPolicy, StateFunction
 
 
-def calculate_gae(values, rewards, dones, next_values, gamma, lambd):
+def discounted_reverse_scan(deltas, discounts):
+    # Solve gaes[t] = deltas[t] + discounts[t] * gaes[t + 1] along dim 0 with a
+    # Hillis-Steele scan: after the step with stride k, gaes[t] holds the sum
+    # over the next 2k terms and discounts[t] their accumulated product, so
+    # log2(T) whole-tensor operations replace T Python iterations.
+    gaes = deltas.clone()
+    discounts = discounts.clone()
+    length = gaes.size(0)
+    k = 1
+    while k < length:
+        gaes[:-k] += discounts[:-k] * gaes[k:]
+        discounts[:-k] = discounts[:-k] * discounts[k:]
+        k *= 2
+        # Every remaining product has underflowed to zero.
+        if k < length and not discounts[:-k].any():
+            break
+    return gaes
+
+
+def calculate_gae(values, rewards, dones, next_values, gamma, lambd,
+                  num_envs=1):
+    # Rows are interleaved across num_envs environments (row t * num_envs + i
+    # is step t of environment i), so the recursion runs along dim 0 of the
+    # (T, num_envs) view. The scan matches the step-by-step loop to float32
+    # tolerance (summation order differs), not bit for bit.
+    shape = rewards.shape
+    values, rewards, dones, next_values = (
+        x.reshape(-1, num_envs)
+        for x in (values, rewards, dones, next_values))
+
     # Calculate TD errors.
     deltas = rewards + gamma * next_values * (1 - dones) - values
-    # Initialize gae.
-    gaes = torch.empty_like(rewards)
 
     # Calculate gae recursively from behind.
-    gaes[-1] = deltas[-1]
-    for t in reversed(range(rewards.size(0) - 1)):
-        gaes[t] = deltas[t] + gamma * lambd * (1 - dones[t]) * gaes[t + 1]
-    
+    gaes = discounted_reverse_scan(deltas, gamma * lambd * (1 - dones))
+
     # Normalize and clip advantages for stability
-    returns = gaes + values
+    returns = (gaes + values).reshape(shape)
+    gaes = gaes.reshape(shape)
     gaes = (gaes - gaes.mean()) / (gaes.std() + 1e-8)
     gaes = torch.clamp(gaes, -10.0, 10.0)  # Clip to avoid extreme values
 
     return returns, gaes
 
 
+def calculate_next_values(critic, states, next_states, values, num_envs=1):
+    # next_states[t] is usually states[t + num_envs] (the episode went on),
+    # so the critic only has to run on the rows where the two differ.
+    next_values = torch.empty_like(values)
+    next_values[:-num_envs] = values[num_envs:]
+    recompute = torch.ones(
+        states.size(0), dtype=torch.bool, device=states.device)
+    recompute[:-num_envs] = (
+        next_states[:-num_envs] != states[num_envs:]).flatten(1).any(dim=1)
+    if recompute.any():
+        next_values[recompute] = critic(next_states[recompute])
+    return next_values
+
+
 class PPO(Algorithm):
 
     def __init__(self, state_shape, action_shape, device, seed, gamma=0.995,
                  rollout_length=2048, mix_buffer=20, lr_actor=1e-4,
                  lr_critic=1e-4, units_actor=(64, 64), units_critic=(64, 64),
                  epoch_ppo=10, clip_eps=0.2, lambd=0.97, coef_ent=0.01,
-                 max_grad_norm=1.0):
+                 max_grad_norm=1.0, num_minibatches=1, minibatch_size=None,
+                 target_kl=None):
         super().__init__(state_shape, action_shape, device, seed, gamma)
 
         # Rollout buffer.
@@ -72,6 +113,22 @@ class PPO(Algorithm):
         self.coef_ent = coef_ent
         self.max_grad_norm = max_grad_norm
 
+        # Each epoch is split into shuffled minibatches (minibatch_size takes
+        # precedence), so learning_steps_ppo counts gradient steps.
+        if minibatch_size is not None:
+            num_minibatches = -(-rollout_length // minibatch_size)
+        self.num_minibatches = max(1, min(num_minibatches, rollout_length))
+
+        # Epochs stop early once the approximate KL divergence between the
+        # rollout policy and the current one exceeds target_kl. The actor
+        # skips the step that detects it; the critic, which runs first, is
+        # deliberately allowed to finish that minibatch.
+        self.target_kl = target_kl
+        self.stop_ppo = False
+        self.epochs_ppo = 0
+        self.log_ppo = False
+        self.loss_critic = None
+
     def is_update(self, step):
         return step % self.rollout_length == 0
 
@@ -204,17 +261,54 @@ class PPO(Algorithm):
 
     def update_ppo(self, states, actions, rewards, dones, log_pis, next_states,
                    writer):
+        # Rollouts of a vector environment interleave its num_envs robots
+        # with the buffer's stride.
+        num_envs = self.buffer.stride
         with torch.no_grad():
             values = self.critic(states)
-            next_values = self.critic(next_states)
+            next_values = calculate_next_values(
+                self.critic, states, next_states, values, num_envs)
 
         targets, gaes = calculate_gae(
-            values, rewards, dones, next_values, self.gamma, self.lambd)
-
-        for _ in range(self.epoch_ppo):
-            self.learning_steps_ppo += 1
-            self.update_critic(states, targets, writer)
-            self.update_actor(states, actions, log_pis, gaes, writer)
+            values, rewards, dones, next_values, self.gamma, self.lambd,
+            num_envs)
+
+        self.stop_ppo = False
+        self.epochs_ppo = 0
+        while self.epochs_ppo < self.epoch_ppo and not self.stop_ppo:
+            self.epochs_ppo += 1
+            minibatches = self.minibatch_indices(states.size(0))
+            for i, idxes in enumerate(minibatches):
+                self.learning_steps_ppo += 1
+                # Log once per update, on its last gradient step. A KL stop
+                # in update_actor also sets the flag.
+                last_step = (self.epochs_ppo == self.epoch_ppo
+                             and i == len(minibatches) - 1)
+                self.log_ppo = last_step
+                if idxes is None:
+                    self.update_critic(states, targets, writer)
+                    self.update_actor(states, actions, log_pis, gaes, writer)
+                else:
+                    self.update_critic(states[idxes], targets[idxes], writer)
+                    self.update_actor(
+                        states[idxes], actions[idxes], log_pis[idxes],
+                        gaes[idxes], writer)
+                if self.stop_ppo:
+                    # The critic ran before the stop and did not log.
+                    if not last_step and self.loss_critic is not None:
+                        writer.add_scalar(
+                            'loss/critic', self.loss_critic.item(), self.learning_steps)
+                    break
+
+        writer.add_scalar('stats/epochs_ppo', self.epochs_ppo, self.learning_steps)
+
+    def minibatch_indices(self, size):
+        # One shuffled permutation per epoch, split into num_minibatches
+        # parts. A single minibatch uses the whole rollout without indexing.
+        if self.num_minibatches == 1:
+            return [None]
+        perm = torch.randperm(size, device=self.device)
+        return torch.tensor_split(perm, self.num_minibatches)
 
     def update_critic(self, states, targets, writer):
         prediction = self.critic(states)
@@ -225,6 +319,7 @@ class PPO(Algorithm):
             return
             
         loss_critic = (prediction - targets).pow_(2).mean()
+        self.loss_critic = loss_critic.detach()
 
         self.optim_critic.zero_grad()
         loss_critic.backward(retain_graph=False)
@@ -237,7 +332,7 @@ class PPO(Algorithm):
         nn.utils.clip_grad_norm_(self.critic.parameters(), self.max_grad_norm)
         self.optim_critic.step()
 
-        if self.learning_steps_ppo % self.epoch_ppo == 0:
+        if self.log_ppo:
             writer.add_scalar(
                 'loss/critic', loss_critic.item(), self.learning_steps)
 
@@ -251,7 +346,15 @@ class PPO(Algorithm):
             
         entropy = -log_pis.mean()
 
-        ratios = (log_pis - log_pis_old).exp_()
+        log_ratios = log_pis - log_pis_old
+        ratios = log_ratios.exp()
+        # Approximate KL(old || new) with the (r - 1) - log(r) estimator.
+        approx_kl = ((ratios - 1) - log_ratios).mean().detach()
+        if self.target_kl is not None and approx_kl.item() > self.target_kl:
+            # Stop before this step moves the policy any further.
+            self.stop_ppo = True
+            self.log_ppo = True
+
         # Clip ratios to prevent extreme values
         ratios = torch.clamp(ratios, 0.0, 10.0)
         
@@ -263,22 +366,25 @@ class PPO(Algorithm):
         ) * gaes
         loss_actor = torch.max(loss_actor1, loss_actor2).mean()
 
-        self.optim_actor.zero_grad()
-        (loss_actor - self.coef_ent * entropy).backward(retain_graph=False)
-        
-        # Clip gradient values for improved stability
-        for param in self.actor.parameters():
-            if param.grad is not None:
-                param.grad.data.clamp_(-1.0, 1.0)
-                
-        nn.utils.clip_grad_norm_(self.actor.parameters(), self.max_grad_norm)
-        self.optim_actor.step()
+        if not self.stop_ppo:
+            self.optim_actor.zero_grad()
+            (loss_actor - self.coef_ent * entropy).backward(retain_graph=False)
+
+            # Clip gradient values for improved stability
+            for param in self.actor.parameters():
+                if param.grad is not None:
+                    param.grad.data.clamp_(-1.0, 1.0)
 
-        if self.learning_steps_ppo % self.epoch_ppo == 0:
+            nn.utils.clip_grad_norm_(self.actor.parameters(), self.max_grad_norm)
+            self.optim_actor.step()
+
+        if self.log_ppo:
             writer.add_scalar(
                 'loss/actor', loss_actor.item(), self.learning_steps)
             writer.add_scalar(
                 'stats/entropy', entropy.item(), self.learning_steps)
+            writer.add_scalar(
+                'stats/approx_kl', approx_kl.item(), self.learning_steps)
 
     def save_models(self, save_dir):
         if not os.path.exists(save_dir):
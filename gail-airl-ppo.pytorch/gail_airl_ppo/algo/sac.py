@@ -4,7 +4,9 @@ from torch import nn
 from torch.optim import Adam
 
 from .base import Algorithm
-from gail_airl_ppo.buffer import Buffer
+from gail_airl_ppo.buffer import (
+    Buffer, PrioritizedBuffer, ShardedBuffer, PrefetchSampler
+)
 from gail_airl_ppo.utils import soft_update, disable_gradient
 from gail_airl_ppo.network import (
     StateDependentPolicy, TwinnedStateActionFunction
@@ -16,16 +18,41 @@ class SAC(Algorithm):
     def __init__(self, state_shape, action_shape, device, seed, gamma=0.99,
                  batch_size=256, buffer_size=10**6, lr_actor=3e-4,
                  lr_critic=3e-4, lr_alpha=3e-4, units_actor=(256, 256),
-                 units_critic=(256, 256), start_steps=10000, tau=5e-3):
+                 units_critic=(256, 256), start_steps=10000, tau=5e-3,
+                 buffer_dtype=torch.float, prefetch_depth=0, prioritized=False,
+                 priority_alpha=0.6, priority_beta=0.4, priority_beta_steps=None,
+                 replay_dir=None, chunk_size=10**5):
         super().__init__(state_shape, action_shape, device, seed, gamma)
 
-        # Replay buffer.
-        self.buffer = Buffer(
+        # Replay buffer, optionally sampled in proportion to TD errors or
+        # kept on disk in chunks under replay_dir.
+        buffer_cls, buffer_kwargs = Buffer, {}
+        if prioritized and replay_dir is not None:
+            raise ValueError("prioritized replay is not supported on disk")
+        if prioritized:
+            buffer_cls = PrioritizedBuffer
+            buffer_kwargs = dict(alpha=priority_alpha, beta=priority_beta,
+                                 beta_steps=priority_beta_steps)
+        if replay_dir is not None:
+            buffer_cls = ShardedBuffer
+            buffer_kwargs = dict(path=replay_dir, chunk_size=chunk_size)
+        self.prioritized = prioritized
+        self.replay_dir = replay_dir
+        self.buffer = buffer_cls(
             buffer_size=buffer_size,
             state_shape=state_shape,
             action_shape=action_shape,
-            device=device
+            device=device,
+            storage_dtype=buffer_dtype,
+            done_dtype=torch.float if buffer_dtype == torch.float else torch.uint8,
+            **buffer_kwargs
         )
+        # Minibatches gathered in the background while the networks update.
+        # They are drawn up to prefetch_depth steps before they are used.
+        self.sampler = None
+        if prefetch_depth > 0:
+            self.sampler = PrefetchSampler(
+                self.buffer, batch_size, prefetch_depth, seed)
 
         # Actor.
         self.actor = StateDependentPolicy(
@@ -91,16 +118,25 @@ class SAC(Algorithm):
 
     def update(self, writer):
         self.learning_steps += 1
-        states, actions, rewards, dones, next_states = \
-            self.buffer.sample(self.batch_size)
-
-        self.update_critic(
-            states, actions, rewards, dones, next_states, writer)
+        if self.sampler is None:
+            batch = self.buffer.sample(self.batch_size)
+        else:
+            batch = self.sampler.sample()
+        states, actions, rewards, dones, next_states = batch[:5]
+
+        if self.prioritized:
+            weights, idxes = batch[5:]
+            td_errors = self.update_critic(
+                states, actions, rewards, dones, next_states, writer, weights)
+            self.buffer.update_priorities(idxes, td_errors)
+        else:
+            self.update_critic(
+                states, actions, rewards, dones, next_states, writer)
         self.update_actor(states, writer)
         self.update_target()
 
     def update_critic(self, states, actions, rewards, dones, next_states,
-                      writer):
+                      writer, weights=None):
         curr_qs1, curr_qs2 = self.critic(states, actions)
         with torch.no_grad():
             next_actions, log_pis = self.actor.sample(next_states)
@@ -108,8 +144,15 @@ class SAC(Algorithm):
             next_qs = torch.min(next_qs1, next_qs2) - self.alpha * log_pis
         target_qs = rewards + (1.0 - dones) * self.gamma * next_qs
 
-        loss_critic1 = (curr_qs1 - target_qs).pow_(2).mean()
-        loss_critic2 = (curr_qs2 - target_qs).pow_(2).mean()
+        if weights is None:
+            loss_critic1 = (curr_qs1 - target_qs).pow_(2).mean()
+            loss_critic2 = (curr_qs2 - target_qs).pow_(2).mean()
+        else:
+            # Importance sampling weights correct for prioritized sampling.
+            td_errors1 = curr_qs1 - target_qs
+            td_errors2 = curr_qs2 - target_qs
+            loss_critic1 = (weights * td_errors1.pow(2)).mean()
+            loss_critic2 = (weights * td_errors2.pow(2)).mean()
 
         self.optim_critic.zero_grad()
         (loss_critic1 + loss_critic2).backward(retain_graph=False)
@@ -121,6 +164,10 @@ class SAC(Algorithm):
             writer.add_scalar(
                 'loss/critic2', loss_critic2.item(), self.learning_steps)
 
+        if weights is not None:
+            # New priorities from the mean TD error of both critics.
+            return (td_errors1.detach().abs() + td_errors2.detach().abs()) / 2
+
     def update_actor(self, states, writer):
         actions, log_pis = self.actor.sample(states)
         qs1, qs2 = self.critic(states, actions)
@@ -160,6 +207,9 @@ class SAC(Algorithm):
             self.actor.state_dict(),
             os.path.join(save_dir, 'actor.pth')
         )
+        if self.replay_dir is not None:
+            # Incremental: only the partially filled chunk is written.
+            self.buffer.save()
 
 
 class SACExpert(SAC):
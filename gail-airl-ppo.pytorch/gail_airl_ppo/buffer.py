@@ -1,128 +1,1075 @@
 import os
+import json
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 import numpy as np
 import torch
 
+COLUMNAR_HEADER = 'header.json'
+COLUMNAR_VERSION = 1
+SHARDED_MANIFEST = 'sharded.json'
+# Row indices of next states and episodes; buffers stay far below 2**31 rows
+INDEX_DTYPE = np.int32
 
-class SerializedBuffer:
 
-    def __init__(self, path, device):
-        tmp = torch.load(path)
-        self.buffer_size = self._n = tmp['state'].size(0)
+def save_columnar(path, columns):
+    """
+    Save a dict of arrays/tensors as a columnar buffer directory.
+
+    Every column is written as a raw <name>.npy file; header.json lists the
+    columns with their dtype and shape. The header is written last, so a
+    directory without one is an unfinished copy.
+    """
+    os.makedirs(path, exist_ok=True)
+    header = {'version': COLUMNAR_VERSION, 'size': None, 'columns': {}}
+    for name, column in columns.items():
+        spec = {'file': f'{name}.npy'}
+        if isinstance(column, torch.Tensor):
+            if column.dtype == torch.bfloat16:
+                # NumPy has no bfloat16; keep the raw bits.
+                spec['torch_dtype'] = 'bfloat16'
+                column = column.view(torch.int16)
+            column = column.cpu().numpy()
+        column = np.ascontiguousarray(column)
+        if name == 'state':
+            header['size'] = len(column)
+        np.save(os.path.join(path, spec['file']), column)
+        spec['dtype'] = column.dtype.str
+        spec['shape'] = list(column.shape)
+        header['columns'][name] = spec
+    with open(os.path.join(path, COLUMNAR_HEADER), 'w') as f:
+        json.dump(header, f, indent=2)
+
+
+def load_columnar(path):
+    """
+    Open a columnar buffer directory as a dict of memory-mapped CPU tensors.
+
+    The files are mapped copy-on-write: nothing is read until it is indexed,
+    and every process that maps the same files shares the page cache.
+    """
+    with open(os.path.join(path, COLUMNAR_HEADER)) as f:
+        header = json.load(f)
+    if header['version'] != COLUMNAR_VERSION:
+        raise ValueError(f"Unsupported columnar buffer version: {header['version']}")
+
+    columns = {}
+    for name, spec in header['columns'].items():
+        array = np.load(os.path.join(path, spec['file']), mmap_mode='c')
+        if list(array.shape) != spec['shape'] or array.dtype.str != spec['dtype']:
+            raise ValueError(f"Column {name} does not match {COLUMNAR_HEADER}")
+        columns[name] = torch.from_numpy(array)
+        if spec.get('torch_dtype') == 'bfloat16':
+            columns[name] = columns[name].view(torch.bfloat16)
+    return columns
+
+
+def dedup_next_states(states, next_states, stride=1):
+    """
+    Split next_states into a next_index array and a terminal_states table.
+
+    next_index[i] >= 0 means next_states[i] is states[next_index[i]]; a
+    negative value -(k + 1) points at terminal_states[k]. Only next states
+    that do not reappear as states[i + stride] (ends of episodes) are kept.
+    """
+    n = states.size(0)
+    next_index = np.arange(stride, n + stride, dtype=INDEX_DTYPE)
+    same = torch.zeros(n, dtype=torch.bool)
+    if n > stride:
+        same[:-stride] = (next_states[:-stride] == states[stride:]).flatten(1).all(dim=1).cpu()
+    terminal = np.flatnonzero(~same.numpy())
+    next_index[terminal] = -np.arange(1, len(terminal) + 1)
+    return next_index, next_states[torch.from_numpy(terminal).to(next_states.device)]
+
+
+def expand_next_states(columns):
+    """Full next_state tensor of a saved buffer in either format"""
+    if 'next_state' in columns:
+        return columns['next_state']
+    return _gather_next_states(
+        columns['state'], columns['next_index'].numpy(), columns['terminal_state'],
+        np.arange(columns['state'].size(0)))
+
+
+def _gather_next_states(states, next_index, terminal_states, idxes):
+    index = next_index[idxes]
+    terminal = index < 0
+    next_states = states[np.where(terminal, 0, index)]
+    if terminal.any():
+        next_states[torch.from_numpy(terminal).to(states.device)] = \
+            terminal_states[-index[terminal] - 1]
+    return next_states
+
+
+class NextStateStorage:
+    """
+    Stores every state once and rebuilds next states by index arithmetic.
+
+    For contiguous trajectories next_states[i] is states[i + stride], where
+    stride is the number of environments whose transitions are interleaved.
+    Next states that never show up as a state (the last observation of an
+    episode, and the newest transitions whose successor has not been
+    appended yet) live in a side table whose slots are reused via a free list.
+
+    An episode is a chain of transitions linked this way. Every row records
+    its episode id and its step within the episode, and a table indexed by
+    episode id holds the first row and the length of every episode, so
+    windows and n-step returns are sampled without looking at dones.
+    """
+
+    # PrefetchSampler reading from this buffer, if any
+    _prefetcher = None
+
+    def _init_next_states(self, size, state_shape, device, stride=1,
+                          dtype=torch.float):
+        assert size % stride == 0, "buffer size must be a multiple of stride"
+        self.stride = stride
+        self._next_index = np.arange(stride, size + stride, dtype=INDEX_DTYPE) % size
+        self._terminal_states = torch.empty(
+            (max(16, 2 * stride), *state_shape), dtype=dtype, device=device)
+        self._free_slots = list(range(self._terminal_states.size(0) - 1, -1, -1))
+        self._init_episodes(size)
+
+    def _init_episodes(self, size):
+        # At most size + stride episodes have rows in the buffer at a time,
+        # so the episode table is indexed by id modulo its length.
+        self._episode_id = np.full(size, -1, dtype=INDEX_DTYPE)
+        self._episode_step = np.zeros(size, dtype=INDEX_DTYPE)
+        self._episode_start = np.zeros(size + self.stride, dtype=INDEX_DTYPE)
+        self._episode_length = np.zeros(size + self.stride, dtype=INDEX_DTYPE)
+        self._num_episodes = 0
+
+    def _track_episodes(self, rows, prev, linked):
+        # Rows linked to their environment's previous transition continue its
+        # episode, the others start a new one. A row's predecessor may be
+        # earlier in the same batch, so rows are handled a stride at a time.
+        table = len(self._episode_length)
+        for start in range(0, len(rows), self.stride):
+            r = rows[start:start + self.stride]
+            pr = prev[start:start + self.stride]
+            ln = linked[start:start + self.stride]
+            new = ~ln
+            ids = np.empty(len(r), dtype=np.int64)
+            steps = np.zeros(len(r), dtype=np.int64)
+            ids[ln] = self._episode_id[pr[ln]]
+            steps[ln] = self._episode_step[pr[ln]] + 1
+            ids[new] = self._num_episodes + np.arange(new.sum())
+            self._num_episodes += int(new.sum())
+            self._episode_start[ids[new] % table] = r[new]
+            self._episode_id[r] = ids
+            self._episode_step[r] = steps
+            self._episode_length[ids % table] = steps + 1
+
+    def _index_episodes(self, episode_index=None, n=None):
+        """
+        Rebuild the episode ids and steps of stored rows from the next_index
+        chains, cut at the episode starts of episode_index if given. Every
+        row finds its first row by pointer jumping in O(log length) passes.
+        If only the first n rows are filled, the others are left untracked.
+        """
+        size = self.states.size(0)
+        if n is None:
+            n = size
+        pred = np.full(n, -1, dtype=np.int64)
+        linked = np.flatnonzero(self._next_index[:n] >= 0)
+        linked = linked[self._next_index[linked] < n]
+        pred[self._next_index[linked]] = linked
+        if episode_index is not None:
+            starts = episode_index[:, 0].cpu().numpy()
+            pred[starts[starts < n]] = -1
+
+        jump = pred.copy()
+        root = np.where(pred >= 0, pred, np.arange(n))
+        step = (pred >= 0).astype(np.int64)
+        active = np.flatnonzero(jump >= 0)
+        while len(active) > 0:
+            j = jump[active]
+            root[active] = root[j]
+            step[active] += step[j]
+            jump[active] = jump[j]
+            active = active[jump[active] >= 0]
+
+        starts, ids = np.unique(root, return_inverse=True)
+        self._init_episodes(size)
+        self._episode_id[:n] = ids
+        self._episode_step[:n] = step
+        self._episode_start[:len(starts)] = starts
+        self._episode_length[:len(starts)] = np.bincount(ids, minlength=len(starts))
+        self._num_episodes = len(starts)
+
+    def _saved_episodes(self, n):
+        # (E, 2) first row and end offset (first row + length) of every
+        # episode with rows in [0, n), oldest first.
+        rows = np.flatnonzero(self._episode_id[:n] >= 0)
+        rows = rows[np.lexsort((self._episode_step[rows], self._episode_id[rows]))]
+        ids = self._episode_id[rows]
+        first = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        lengths = np.diff(np.r_[first, len(rows)])
+        starts = rows[first]
+        return torch.from_numpy(np.stack([starts, starts + lengths], axis=1).astype(INDEX_DTYPE))
+
+    def _add_terminals(self, states):
+        n = states.size(0)
+        while len(self._free_slots) < n:
+            # Double the side table.
+            size = self._terminal_states.size(0)
+            self._terminal_states = torch.cat(
+                [self._terminal_states, torch.empty_like(self._terminal_states)])
+            self._free_slots[:0] = range(2 * size - 1, size - 1, -1)
+        slots = self._free_slots[:-n - 1:-1]
+        del self._free_slots[-n:]
+        self._terminal_states[slots] = states.to(self._terminal_states)
+        return np.array(slots, dtype=np.int64)
+
+    def _add_terminal(self, state):
+        return self._add_terminals(torch.from_numpy(state).unsqueeze(0))[0]
+
+    def _append_states(self, p, size, state, next_state):
+        # Batches being gathered in the background must not see this write.
+        if self._prefetcher is not None:
+            self._prefetcher.wait()
+
+        # The row being overwritten gives back its side-table slot.
+        if self._next_index[p] < 0:
+            self._free_slots.append(-self._next_index[p] - 1)
+        self.states[p].copy_(torch.from_numpy(state))
+
+        # The previous transition of this environment ended in this state,
+        # unless an episode ended in between.
+        prev = (p - self.stride) % size
+        linked = False
+        if self._n >= self.stride and self._next_index[prev] < 0:
+            slot = -self._next_index[prev] - 1
+            if torch.equal(self._terminal_states[slot], self.states[p]):
+                self._free_slots.append(slot)
+                self._next_index[prev] = p
+                linked = True
+
+        # Same as _track_episodes, for a single row.
+        if linked:
+            episode = self._episode_id[prev]
+            step = self._episode_step[prev] + 1
+        else:
+            episode, step = self._num_episodes, 0
+            self._num_episodes += 1
+            self._episode_start[episode % len(self._episode_length)] = p
+        self._episode_id[p] = episode
+        self._episode_step[p] = step
+        self._episode_length[episode % len(self._episode_length)] = step + 1
+
+        # Until its successor arrives, this next state is kept aside.
+        self._next_index[p] = -self._add_terminal(next_state) - 1
+
+    def _extend_states(self, p, size, states, next_states):
+        # Batched _append_states for rows p, ..., p + n - 1 (mod size).
+        n = states.size(0)
+        assert n <= size - self.stride, "batch does not fit into the buffer"
+        if self._prefetcher is not None:
+            self._prefetcher.wait()
+
+        rows = (p + np.arange(n)) % size
+        overwritten = self._next_index[rows]
+        self._free_slots.extend((-overwritten[overwritten < 0] - 1).tolist())
+        self._write_rows(self.states, p, states)
+        self._next_index[rows] = -self._add_terminals(next_states) - 1
+
+        # Link every row to its environment's previous transition, which is
+        # either earlier in the batch or already stored.
+        filled = np.minimum(self._n + np.arange(n), size) >= self.stride
+        prev = (rows - self.stride) % size
+        prev_index = self._next_index[prev]
+        candidates = np.flatnonzero(filled & (prev_index < 0))
+        linked = np.zeros(n, dtype=bool)
+        if len(candidates) > 0:
+            slots = -prev_index[candidates] - 1
+            device = self.states.device
+            same = (self._terminal_states[torch.from_numpy(slots).to(device)]
+                    == self.states[torch.from_numpy(rows[candidates]).to(device)])
+            same = same.flatten(1).all(dim=1).cpu().numpy()
+            self._free_slots.extend(slots[same].tolist())
+            self._next_index[prev[candidates[same]]] = rows[candidates[same]]
+            linked[candidates[same]] = True
+        self._track_episodes(rows, prev, linked)
+
+    @staticmethod
+    def _write_rows(field, p, values):
+        # Copy values into rows p, p + 1, ... of field, wrapping around once.
+        n = values.size(0)
+        first = min(n, field.size(0) - p)
+        field[p:p + first].copy_(values[:first].reshape(field[p:p + first].shape))
+        if first < n:
+            field[:n - first].copy_(values[first:].reshape(field[:n - first].shape))
+
+    def _steps_left(self, idxes):
+        # Transitions that follow idxes in their episodes
+        ids = self._episode_id[idxes] % len(self._episode_length)
+        return self._episode_length[ids] - self._episode_step[idxes] - 1
+
+    def _episode_rows(self, idxes, length):
+        # (B, length) rows of idxes and the steps after them, repeating the
+        # last row of an episode past its end.
+        rows = np.empty((len(idxes), length), dtype=np.int64)
+        rows[:, 0] = idxes
+        steps_left = self._steps_left(idxes)
+        for k in range(1, length):
+            rows[:, k] = np.where(
+                k <= steps_left, self._next_index[rows[:, k - 1]], rows[:, k - 1])
+        return rows, steps_left
+
+    def sample_windows(self, batch_size, length, max_tries=100):
+        """
+        Sample batch_size windows of length consecutive transitions from
+        single episodes. Every returned field has the shape (B, length, ...).
+        Start rows that are too close to the end of their episode are drawn
+        again.
+        """
+        idxes = np.asarray(self._sample_idxes(batch_size))
+        for _ in range(max_tries):
+            short = np.flatnonzero(self._steps_left(idxes) < length - 1)
+            if len(short) == 0:
+                break
+            idxes[short] = np.asarray(self._sample_idxes(len(short)))
+        else:
+            raise ValueError(f"Too few episodes with {length} transitions")
+
+        rows, _ = self._episode_rows(idxes, length)
+        return tuple(
+            torch.as_tensor(x).view(batch_size, length, *x.shape[1:])
+            for x in self._gather(rows.ravel()))
+
+    def sample_n_step(self, batch_size, n, gamma):
+        """
+        Sample transitions with n-step returns, truncated at the end of an
+        episode. Returns states, actions, returns, dones and next states of
+        the last step, and the discounts gamma ** steps for bootstrapping.
+        """
+        idxes = np.asarray(self._sample_idxes(batch_size))
+        rows, steps_left = self._episode_rows(idxes, n)
+        num_steps = np.minimum(steps_left + 1, n)
+        last = rows[np.arange(batch_size), num_steps - 1]
+
+        device = self.rewards.device
+        rewards = self.rewards[torch.from_numpy(rows.ravel()).to(device)]
+        rewards = rewards.float().view(batch_size, n)
+        mask = torch.arange(n) < torch.from_numpy(num_steps).unsqueeze(1)
+        discounts = gamma ** torch.arange(n, dtype=torch.float)
+        returns = (rewards * (mask * discounts).to(device)).sum(dim=1, keepdim=True)
+
+        states, actions = self._gather(idxes)[:2]
+        last_t = torch.from_numpy(last).to(device)
+        return (
+            states,
+            actions,
+            returns.to(self.device),
+            self.dones[last_t].to(self.device, torch.float),
+            self._next_states_at(last).to(self.device, torch.float),
+            (gamma ** torch.from_numpy(num_steps).float()).view(-1, 1).to(self.device)
+        )
+
+    def _next_states_at(self, idxes):
+        return _gather_next_states(
+            self.states, self._next_index, self._terminal_states, idxes)
+
+    def _saved_next_states(self, n):
+        # Compact representation of rows [0, n) for saving.
+        next_index = self._next_index[:n].copy()
+        terminal = np.flatnonzero(next_index < 0)
+        slots = -next_index[terminal] - 1
+        next_index[terminal] = -np.arange(1, len(terminal) + 1)
+        terminal_states = self._terminal_states[
+            torch.from_numpy(slots).to(self._terminal_states.device)]
+        return torch.from_numpy(next_index), terminal_states.cpu()
+
+    def _pack(self, names, dtype, copy=True):
+        # Move the given fields into one [N, D_total] tensor and replace them
+        # by views of their columns, so that a sample is a single gather.
+        fields = [getattr(self, name) for name in names]
+        widths = [field[0].numel() for field in fields]
+        self._packed = torch.empty(
+            (fields[0].size(0), sum(widths)), dtype=dtype, device=fields[0].device)
+        self._fields = []
+        offset = 0
+        for name, field, width in zip(names, fields, widths):
+            view = self._packed[:, offset:offset + width]
+            if copy:
+                view.copy_(field.flatten(1))
+            setattr(self, name, view.unflatten(1, field.shape[1:]))
+            self._fields.append((offset, offset + width, field.shape[1:]))
+            offset += width
+
+    def _sample_idxes(self, batch_size, generator=None):
+        # Packed buffers and explicit generators draw with torch.randint,
+        # everything else with NumPy's global generator.
+        if self._packed is not None or generator is not None:
+            return torch.randint(
+                self._n, (batch_size,), generator=generator or self.generator)
+        return np.random.randint(low=0, high=self._n, size=batch_size)
+
+    def _gather_packed(self, idxes):
+        # One index_select over the rows and their successors; the fields
+        # are returned as views of the gathered rows.
+        idxes = torch.as_tensor(idxes)
+        batch_size = idxes.size(0)
+        next_index = torch.from_numpy(self._next_index)[idxes]
+        rows = self._packed.index_select(0, torch.cat(
+            [idxes, next_index.clamp(min=0)]).to(self._packed.device))
+
+        batch = [self._unpack(rows[:batch_size], field) for field in self._fields]
+        next_states = self._unpack(rows[batch_size:], self._fields[0])
+        terminal = torch.nonzero(next_index < 0).squeeze(1)
+        if terminal.numel() > 0:
+            slots = -next_index.index_select(0, terminal) - 1
+            next_states.index_copy_(
+                0, terminal.to(rows.device),
+                self._terminal_states.index_select(
+                    0, slots.to(rows.device)).to(rows.dtype))
+        return batch, next_states
+
+    @staticmethod
+    def _unpack(rows, field):
+        start, end, shape = field
+        if len(shape) == 1:
+            return rows[:, start:end]
+        return rows[:, start:end].unflatten(1, shape)
+
+    @property
+    def next_states(self):
+        return self._next_states_at(np.arange(self.states.size(0)))
+
+    @next_states.setter
+    def next_states(self, next_states):
+        self._next_index, self._terminal_states = dedup_next_states(
+            self.states, next_states, self.stride)
+        self._free_slots = []
+
+
+class SerializedBuffer(NextStateStorage):
+    """
+    Expert transitions loaded from a .pth file or a columnar directory.
+
+    storage_dtype (e.g. torch.float16 or torch.bfloat16) keeps states and
+    actions in reduced precision; sample() always returns float32.
+
+    packed=True copies all fields into one [N, D_total] tensor of the
+    storage dtype (rewards and dones included), so that sample() needs a
+    single torch.randint, drawn from generator if one is given, and a
+    single index_select.
+    """
+
+    def __init__(self, path, device, storage_dtype=None, packed=False,
+                 generator=None):
         self.device = device
+        self.generator = generator
+        self._packed = None
+        if os.path.isdir(path):
+            # Columnar buffers stay memory-mapped on the host; only sampled
+            # rows are read and moved to the device.
+            tmp = load_columnar(path)
+            self._storage_device = torch.device('cpu')
+        else:
+            tmp = torch.load(path)
+            self._storage_device = device
+        self.buffer_size = self._n = tmp['state'].size(0)
+        self.stride = 1
 
-        self.states = tmp['state'].clone().to(self.device)
-        self.actions = tmp['action'].clone().to(self.device)
-        self.rewards = tmp['reward'].clone().to(self.device)
-        self.dones = tmp['done'].clone().to(self.device)
-        self.next_states = tmp['next_state'].clone().to(self.device)
+        dtype = storage_dtype or tmp['state'].dtype
+        self.states = tmp['state'].to(self._storage_device, dtype)
+        self.actions = tmp['action'].to(self._storage_device, dtype)
+        self.rewards = tmp['reward'].to(self._storage_device)
+        self.dones = tmp['done'].to(self._storage_device)
+        if 'next_index' in tmp:
+            # Files written before INDEX_DTYPE hold int64 indices
+            self._next_index = tmp['next_index'].numpy().astype(INDEX_DTYPE, copy=False)
+            self._terminal_states = tmp['terminal_state'].to(self._storage_device, dtype)
+            self._free_slots = []
+        else:
+            # make_buffer.py and older files only store full next states.
+            self.next_states = tmp['next_state'].to(self._storage_device, dtype)
+        self._index_episodes(tmp.get('episode_index'))
+        if packed:
+            self._pack(['states', 'actions', 'rewards', 'dones'], dtype)
 
     def sample(self, batch_size):
-        idxes = np.random.randint(low=0, high=self._n, size=batch_size)
+        return self._gather(self._sample_idxes(batch_size))
+
+    def _gather(self, idxes):
+        if self._packed is not None:
+            batch, next_states = self._gather_packed(idxes)
+            return tuple(
+                x.to(self.device, torch.float) for x in (*batch, next_states))
+
+        idxes = np.asarray(idxes)
+        # Stored dtypes are only widened to float32 for the sampled rows.
         return (
-            self.states[idxes],
-            self.actions[idxes],
-            self.rewards[idxes],
-            self.dones[idxes],
-            self.next_states[idxes]
+            self.states[idxes].to(self.device, torch.float),
+            self.actions[idxes].to(self.device, torch.float),
+            self.rewards[idxes].to(self.device, torch.float),
+            self.dones[idxes].to(self.device, torch.float),
+            self._next_states_at(idxes).to(self.device, torch.float)
         )
 
 
 class Buffer(SerializedBuffer):
+    """
+    Replay buffer. States and actions are stored as storage_dtype and dones
+    as done_dtype (e.g. torch.uint8); sample() upcasts them to float32.
+    packed=True stores every field in one storage_dtype tensor (see
+    SerializedBuffer).
+    """
 
-    def __init__(self, buffer_size, state_shape, action_shape, device):
+    def __init__(self, buffer_size, state_shape, action_shape, device,
+                 num_envs=1, storage_dtype=torch.float, done_dtype=torch.float,
+                 packed=False, generator=None):
         self._n = 0
         self._p = 0
         self.buffer_size = buffer_size
         self.device = device
+        self.generator = generator
+        self._packed = None
 
         self.states = torch.empty(
-            (buffer_size, *state_shape), dtype=torch.float, device=device)
+            (buffer_size, *state_shape), dtype=storage_dtype, device=device)
         self.actions = torch.empty(
-            (buffer_size, *action_shape), dtype=torch.float, device=device)
+            (buffer_size, *action_shape), dtype=storage_dtype, device=device)
         self.rewards = torch.empty(
             (buffer_size, 1), dtype=torch.float, device=device)
         self.dones = torch.empty(
-            (buffer_size, 1), dtype=torch.float, device=device)
-        self.next_states = torch.empty(
-            (buffer_size, *state_shape), dtype=torch.float, device=device)
+            (buffer_size, 1), dtype=done_dtype, device=device)
+        self._init_next_states(
+            buffer_size, state_shape, device, num_envs, storage_dtype)
+        if packed:
+            self._pack(['states', 'actions', 'rewards', 'dones'],
+                       storage_dtype, copy=False)
 
     def append(self, state, action, reward, done, next_state):
-        self.states[self._p].copy_(torch.from_numpy(state))
+        self._append_states(self._p, self.buffer_size, state, next_state)
         self.actions[self._p].copy_(torch.from_numpy(action))
         self.rewards[self._p] = float(reward)
         self.dones[self._p] = float(done)
-        self.next_states[self._p].copy_(torch.from_numpy(next_state))
 
         self._p = (self._p + 1) % self.buffer_size
         self._n = min(self._n + 1, self.buffer_size)
 
-    def save(self, path):
+    def extend(self, states, actions, rewards, dones, next_states):
+        """
+        Append a batch of N transitions, e.g. one step of a vector
+        environment, with one copy per field.
+        """
+        states = torch.as_tensor(states)
+        n = states.size(0)
+        self._extend_states(
+            self._p, self.buffer_size, states, torch.as_tensor(next_states))
+        self._write_rows(self.actions, self._p, torch.as_tensor(actions))
+        self._write_rows(self.rewards, self._p, torch.as_tensor(rewards))
+        self._write_rows(self.dones, self._p, torch.as_tensor(dones))
+
+        self._p = (self._p + n) % self.buffer_size
+        self._n = min(self._n + n, self.buffer_size)
+
+    def save(self, path, columnar=False):
         if not os.path.exists(os.path.dirname(path)):
             os.makedirs(os.path.dirname(path))
 
+        next_index, terminal_states = self._saved_next_states(self.buffer_size)
+        episode_index = self._saved_episodes(self.buffer_size)
+        if columnar:
+            save_columnar(path, {
+                'state': self.states,
+                'action': self.actions,
+                'reward': self.rewards,
+                'done': self.dones,
+                'next_index': next_index,
+                'terminal_state': terminal_states,
+                'episode_index': episode_index,
+            })
+            return
+
+        # The .pth format also keeps the full next states that older readers
+        # expect; next_index preserves the links of interleaved environments.
         torch.save({
             'state': self.states.clone().cpu(),
             'action': self.actions.clone().cpu(),
             'reward': self.rewards.clone().cpu(),
             'done': self.dones.clone().cpu(),
-            'next_state': self.next_states.clone().cpu(),
+            'next_state': self.next_states.cpu(),
+            'next_index': next_index,
+            'terminal_state': terminal_states,
+            'episode_index': episode_index,
         }, path)
 
 
-class RolloutBuffer:
 
-    def __init__(self, buffer_size, state_shape, action_shape, device, mix=1):
+class SumTree:
+    """
+    Array-backed binary tree whose leaves hold priorities and whose inner
+    nodes hold the sum of their children. Node k has children 2k and 2k + 1;
+    the root is node 1. Updates and lookups work on whole batches, one
+    vectorized NumPy step per level.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._leaf_start = 1 << max(capacity - 1, 0).bit_length()
+        self._depth = self._leaf_start.bit_length() - 1
+        self._tree = np.zeros(2 * self._leaf_start, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self._tree[1]
+
+    def get(self, idxes):
+        return self._tree[self._leaf_start + np.asarray(idxes)]
+
+    def update(self, idxes, priorities):
+        nodes = self._leaf_start + np.asarray(idxes)
+        self._tree[nodes] = priorities
+        for _ in range(self._depth):
+            nodes = np.unique(nodes // 2)
+            self._tree[nodes] = self._tree[2 * nodes] + self._tree[2 * nodes + 1]
+
+    def find(self, values):
+        """Leaves at which the prefix sums of the priorities reach values"""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self._depth):
+            left = self._tree[2 * nodes]
+            right = values > left
+            values -= np.where(right, left, 0.0)
+            nodes = 2 * nodes + right
+        return nodes - self._leaf_start
+
+
+class PrioritizedBuffer(Buffer):
+    """
+    Replay buffer with proportional prioritization (Schaul et al., 2016).
+
+    Rows are sampled with probability p_i / sum(p), where p_i is
+    (|TD error| + eps) ** alpha and new rows get the largest priority seen
+    so far. sample() returns the Buffer fields followed by importance
+    sampling weights (N * P(i)) ** -beta, normalized by their maximum over
+    the batch, and the sampled indices for update_priorities(). With
+    beta_steps, beta is annealed linearly to 1 over that many
+    update_priorities() calls, so the correction is unbiased by the end.
+    """
+
+    def __init__(self, buffer_size, state_shape, action_shape, device,
+                 num_envs=1, storage_dtype=torch.float, done_dtype=torch.float,
+                 packed=False, generator=None, alpha=0.6, beta=0.4, eps=1e-6,
+                 beta_steps=None):
+        super().__init__(
+            buffer_size, state_shape, action_shape, device, num_envs,
+            storage_dtype, done_dtype, packed, generator)
+        self.alpha = alpha
+        self.beta = self.beta_start = beta
+        self.beta_steps = beta_steps
+        self.eps = eps
+        self._num_updates = 0
+        self.max_priority = 1.0
+        self._tree = SumTree(buffer_size)
+
+    def append(self, state, action, reward, done, next_state):
+        row = self._p
+        super().append(state, action, reward, done, next_state)
+        self._tree.update([row], self.max_priority)
+
+    def extend(self, states, actions, rewards, dones, next_states):
+        rows = (self._p + np.arange(len(states))) % self.buffer_size
+        super().extend(states, actions, rewards, dones, next_states)
+        self._tree.update(rows, self.max_priority)
+
+    def _sample_idxes(self, batch_size, generator=None):
+        # One uniform draw in each of batch_size equal slices of the total.
+        generator = generator or self.generator
+        if generator is not None:
+            u = torch.rand(batch_size, dtype=torch.float64, generator=generator).numpy()
+        else:
+            u = np.random.uniform(size=batch_size)
+        values = (np.arange(batch_size) + u) * (self._tree.total / batch_size)
+        return np.minimum(self._tree.find(values), self._n - 1)
+
+    def _gather(self, idxes):
+        idxes = np.asarray(idxes)
+        probs = self._tree.get(idxes) / self._tree.total
+        weights = (self._n * probs) ** -self.beta
+        weights /= weights.max()
+        return (
+            *super()._gather(idxes),
+            torch.tensor(weights, dtype=torch.float, device=self.device).view(-1, 1),
+            idxes
+        )
+
+    def update_priorities(self, idxes, td_errors):
+        if self._prefetcher is not None:
+            self._prefetcher.wait()
+        td_errors = torch.as_tensor(td_errors).detach().flatten().cpu().numpy()
+        priorities = (np.abs(td_errors) + self.eps) ** self.alpha
+        self._tree.update(idxes, priorities)
+        self.max_priority = max(self.max_priority, priorities.max())
+        if self.beta_steps:
+            # Batches scheduled from now on use the annealed beta.
+            self._num_updates += 1
+            progress = min(1.0, self._num_updates / self.beta_steps)
+            self.beta = self.beta_start + progress * (1.0 - self.beta_start)
+
+
+class ShardedBuffer:
+    """
+    Replay buffer that spills to disk in fixed-size columnar chunks.
+
+    Transitions are appended to an in-memory Buffer of chunk_size rows.
+    When it is full, its columns are written to path/chunk_<k> on a
+    background thread and then reopened memory-mapped, so only the chunk
+    being filled (and chunks still being written) are held in RAM. When an
+    append would exceed buffer_size rows, the oldest chunk is dropped first.
+    sample() draws uniformly over all rows and reads each touched chunk
+    with one gather. save() only writes the partial chunk and a manifest;
+    a ShardedBuffer opened on the same path resumes from them, episode
+    index included.
+    """
+
+    # PrefetchSampler reading from this buffer, if any
+    _prefetcher = None
+
+    def __init__(self, path, buffer_size, state_shape, action_shape, device,
+                 chunk_size=10**5, num_envs=1, storage_dtype=torch.float,
+                 done_dtype=torch.float, generator=None):
+        assert buffer_size % chunk_size == 0, \
+            "buffer size must be a multiple of chunk size"
+        self.path = path
+        self.buffer_size = buffer_size
+        self.chunk_size = chunk_size
+        self.device = device
+        self.generator = generator
+        self._hot_args = (chunk_size, state_shape, action_shape,
+                          torch.device('cpu'), num_envs, storage_dtype,
+                          done_dtype)
+        self._chunks = []
+        self._chunk_names = []
+        self._pending = {}
+        self._dropped = []
+        self._next_chunk = 0
+        self._hot_name = None
+        self._next_hot = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._hot = Buffer(*self._hot_args)
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, SHARDED_MANIFEST)):
+            self._resume()
+
+    @property
+    def _n(self):
+        return len(self._chunks) * self.chunk_size + self._hot._n
+
+    def append(self, state, action, reward, done, next_state):
+        if self._prefetcher is not None:
+            self._prefetcher.wait()
+        if self._n == self.buffer_size:
+            # The last checkpoint may still list the oldest chunk, so its
+            # files are only deleted by the next save().
+            self._chunks.pop(0)
+            self._dropped.append(self._chunk_names.pop(0))
+        self._hot.append(state, action, reward, done, next_state)
+        if self._hot._n == self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        hot = self._hot
+        next_index, terminal_states = hot._saved_next_states(self.chunk_size)
+        columns = {
+            'state': hot.states,
+            'action': hot.actions,
+            'reward': hot.rewards,
+            'done': hot.dones,
+            'next_index': next_index,
+            'terminal_state': terminal_states,
+        }
+        name = f'chunk_{self._next_chunk:06d}'
+        self._next_chunk += 1
+        self._chunks.append(columns)
+        self._chunk_names.append(name)
+        self._pending[name] = self._executor.submit(
+            save_columnar, os.path.join(self.path, name), columns)
+        self._hot = Buffer(*self._hot_args)
+        self._collect()
+
+    def _collect(self):
+        # Swap chunks whose write has finished for their memory-mapped files.
+        for name, future in list(self._pending.items()):
+            if future.done():
+                future.result()
+                del self._pending[name]
+                if name in self._chunk_names:
+                    i = self._chunk_names.index(name)
+                    self._chunks[i] = load_columnar(os.path.join(self.path, name))
+
+    def _sample_idxes(self, batch_size, generator=None):
+        generator = generator or self.generator
+        if generator is not None:
+            return torch.randint(self._n, (batch_size,), generator=generator).numpy()
+        return np.random.randint(low=0, high=self._n, size=batch_size)
+
+    def sample(self, batch_size):
+        return self._gather(self._sample_idxes(batch_size))
+
+    def _gather(self, idxes):
+        # Sorted indices keep the reads of every chunk together; the rows
+        # of a minibatch are exchangeable, so their order does not matter.
+        idxes = np.sort(np.asarray(idxes))
+        chunk_ids, starts = np.unique(idxes // self.chunk_size, return_index=True)
+        parts = []
+        for chunk_id, start, end in zip(chunk_ids, starts, [*starts[1:], len(idxes)]):
+            rows = idxes[start:end] % self.chunk_size
+            if chunk_id == len(self._chunks):
+                parts.append(self._hot._gather(rows))
+                continue
+            columns = self._chunks[chunk_id]
+            parts.append((
+                columns['state'][rows],
+                columns['action'][rows],
+                columns['reward'][rows],
+                columns['done'][rows],
+                _gather_next_states(
+                    columns['state'], columns['next_index'].numpy(),
+                    columns['terminal_state'], rows)
+            ))
+        return tuple(
+            torch.cat([part[i].float() for part in parts]).to(self.device)
+            for i in range(5))
+
+    def save(self):
+        """
+        Checkpoint the buffer. Full chunks are already on disk, so only the
+        filled rows of the chunk being filled and the manifest are written.
+
+        The partial chunk goes to a new hot_<k> directory and the manifest
+        is swapped in with os.replace; the previous hot directory and
+        dropped chunks are only deleted after that, so a crash at any point
+        leaves a manifest whose files all exist.
+        """
+        for future in self._pending.values():
+            future.result()
+        self._collect()
+        hot_name = f'hot_{self._next_hot:06d}'
+        self._next_hot += 1
+        hot, n = self._hot, self._hot._n
+        next_index, terminal_states = hot._saved_next_states(n)
+        save_columnar(os.path.join(self.path, hot_name), {
+            'state': hot.states[:n],
+            'action': hot.actions[:n],
+            'reward': hot.rewards[:n],
+            'done': hot.dones[:n],
+            'next_index': next_index,
+            'terminal_state': terminal_states,
+            'episode_index': hot._saved_episodes(n),
+        })
+        manifest = {
+            'chunk_size': self.chunk_size,
+            'chunks': self._chunk_names,
+            'next_chunk': self._next_chunk,
+            'hot': hot_name,
+            'next_hot': self._next_hot,
+            'hot_size': self._hot._n,
+        }
+        manifest_path = os.path.join(self.path, SHARDED_MANIFEST)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+        stale = self._dropped
+        if self._hot_name is not None:
+            stale.append(self._hot_name)
+        for name in stale:
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        self._dropped = []
+        self._hot_name = hot_name
+
+    def _resume(self):
+        with open(os.path.join(self.path, SHARDED_MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest['chunk_size'] != self.chunk_size:
+            raise ValueError("chunk size differs from the saved buffer")
+        self._chunk_names = manifest['chunks']
+        self._next_chunk = manifest['next_chunk']
+        self._chunks = [load_columnar(os.path.join(self.path, name))
+                        for name in self._chunk_names]
+        # Manifests written before hot directories were versioned use 'hot'
+        self._hot_name = manifest.get('hot', 'hot')
+        self._next_hot = manifest.get('next_hot', 0)
+
+        n = manifest['hot_size']
+        if n > 0:
+            columns = load_columnar(os.path.join(self.path, self._hot_name))
+            hot = self._hot
+            # Older checkpoints hold the whole chunk, newer ones its n rows
+            for field, name in ((hot.states, 'state'), (hot.actions, 'action'),
+                                (hot.rewards, 'reward'), (hot.dones, 'done')):
+                field[:n].copy_(columns[name][:n])
+            hot._next_index[:n] = columns['next_index'][:n].numpy()
+            hot._terminal_states = columns['terminal_state'].clone()
+            hot._free_slots = []
+            hot._n = hot._p = n
+            hot._index_episodes(columns.get('episode_index'), n)
+
+class RolloutBuffer(NextStateStorage):
+    """
+    On-policy rollout storage. States and actions are stored as storage_dtype
+    and dones as done_dtype; get() and sample() return float32 tensors.
+    packed=True stores every field in one storage_dtype tensor (see
+    SerializedBuffer).
+    """
+
+    def __init__(self, buffer_size, state_shape, action_shape, device, mix=1,
+                 num_envs=1, storage_dtype=torch.float, done_dtype=torch.float,
+                 packed=False, generator=None):
         self._n = 0
         self._p = 0
+        self.device = device
+        self.generator = generator
+        self._packed = None
         self.mix = mix
         self.buffer_size = buffer_size
         self.total_size = mix * buffer_size
 
         self.states = torch.empty(
-            (self.total_size, *state_shape), dtype=torch.float, device=device)
+            (self.total_size, *state_shape), dtype=storage_dtype, device=device)
         self.actions = torch.empty(
-            (self.total_size, *action_shape), dtype=torch.float, device=device)
+            (self.total_size, *action_shape), dtype=storage_dtype, device=device)
         self.rewards = torch.empty(
             (self.total_size, 1), dtype=torch.float, device=device)
         self.dones = torch.empty(
-            (self.total_size, 1), dtype=torch.float, device=device)
+            (self.total_size, 1), dtype=done_dtype, device=device)
         self.log_pis = torch.empty(
             (self.total_size, 1), dtype=torch.float, device=device)
-        self.next_states = torch.empty(
-            (self.total_size, *state_shape), dtype=torch.float, device=device)
+        self._init_next_states(
+            self.total_size, state_shape, device, num_envs, storage_dtype)
+        if packed:
+            self._pack(['states', 'actions', 'rewards', 'dones', 'log_pis'],
+                       storage_dtype, copy=False)
 
     def append(self, state, action, reward, done, log_pi, next_state):
-        self.states[self._p].copy_(torch.from_numpy(state))
+        self._append_states(self._p, self.total_size, state, next_state)
         self.actions[self._p].copy_(torch.from_numpy(action))
         self.rewards[self._p] = float(reward)
         self.dones[self._p] = float(done)
         self.log_pis[self._p] = float(log_pi)
-        self.next_states[self._p].copy_(torch.from_numpy(next_state))
 
         self._p = (self._p + 1) % self.total_size
         self._n = min(self._n + 1, self.total_size)
 
+    def extend(self, states, actions, rewards, dones, log_pis, next_states):
+        """
+        Append a batch of N transitions, e.g. one step of a vector
+        environment, with one copy per field.
+        """
+        states = torch.as_tensor(states)
+        n = states.size(0)
+        self._extend_states(
+            self._p, self.total_size, states, torch.as_tensor(next_states))
+        self._write_rows(self.actions, self._p, torch.as_tensor(actions))
+        self._write_rows(self.rewards, self._p, torch.as_tensor(rewards))
+        self._write_rows(self.dones, self._p, torch.as_tensor(dones))
+        self._write_rows(self.log_pis, self._p, torch.as_tensor(log_pis))
+
+        self._p = (self._p + n) % self.total_size
+        self._n = min(self._n + n, self.total_size)
+
     def get(self):
         assert self._p % self.buffer_size == 0
         start = (self._p - self.buffer_size) % self.total_size
         idxes = slice(start, start + self.buffer_size)
         return (
-            self.states[idxes],
-            self.actions[idxes],
-            self.rewards[idxes],
-            self.dones[idxes],
-            self.log_pis[idxes],
-            self.next_states[idxes]
+            self.states[idxes].float(),
+            self.actions[idxes].float(),
+            self.rewards[idxes].float(),
+            self.dones[idxes].float(),
+            self.log_pis[idxes].float(),
+            self._next_states_at(np.arange(start, start + self.buffer_size)).float()
         )
 
     def sample(self, batch_size):
+        return self._gather(self._sample_idxes(batch_size))
+
+    def _gather(self, idxes):
         assert self._p % self.buffer_size == 0
-        idxes = np.random.randint(low=0, high=self._n, size=batch_size)
+        if self._packed is not None:
+            (states, actions, rewards, dones, log_pis), next_states = \
+                self._gather_packed(idxes)
+            return (
+                states.float(),
+                actions.float(),
+                rewards.float(),
+                dones.float(),
+                log_pis.float(),
+                next_states.float()
+            )
+
+        idxes = np.asarray(idxes)
         return (
-            self.states[idxes],
-            self.actions[idxes],
+            self.states[idxes].float(),
+            self.actions[idxes].float(),
             self.rewards[idxes],
-            self.dones[idxes],
+            self.dones[idxes].float(),
             self.log_pis[idxes],
-            self.next_states[idxes]
+            self._next_states_at(idxes).float()
         )
+
+
+class PrefetchSampler:
+    """
+    Draws minibatches of a buffer ahead of time on a background thread.
+
+    sample() returns the oldest prefetched batch and schedules the next one,
+    so that up to depth batches are gathered while the caller runs its
+    gradient step. Indices are drawn on the calling thread when a batch is
+    scheduled: with a seed they come from a dedicated torch.Generator and
+    the sequence of batches only depends on the seed and the buffer
+    contents. Appending to the buffer first waits for the gathers in
+    flight, so a batch always reflects the buffer as it was when the batch
+    was scheduled (up to depth appends earlier).
+    """
+
+    def __init__(self, buffer, batch_size, depth=2, seed=None):
+        assert buffer._prefetcher is None, "buffer already has a sampler"
+        self.buffer = buffer
+        self.batch_size = batch_size
+        self.depth = depth
+        self.generator = None
+        if seed is not None:
+            self.generator = torch.Generator().manual_seed(seed)
+        self._num_batches = None
+        self._futures = deque()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        buffer._prefetcher = self
+
+    def sample(self):
+        while len(self._futures) <= self.depth and self._num_batches != 0:
+            idxes = self.buffer._sample_idxes(self.batch_size, self.generator)
+            self._futures.append(self._executor.submit(self.buffer._gather, idxes))
+            if self._num_batches is not None:
+                self._num_batches -= 1
+        if not self._futures:
+            # More batches than budgeted by reset(): gather synchronously.
+            return self.buffer._gather(
+                self.buffer._sample_idxes(self.batch_size, self.generator))
+        return self._futures.popleft().result()
+
+    def reset(self, num_batches=None):
+        """
+        Drop prefetched batches, e.g. after the buffer was refilled, and
+        schedule at most num_batches more until the next reset. Batches
+        sampled beyond that budget are gathered without prefetching.
+        """
+        self.wait()
+        self._futures.clear()
+        self._num_batches = num_batches
+
+    def wait(self):
+        wait(self._futures)
+
+    def close(self):
+        self.reset()
+        self._executor.shutdown()
+        self.buffer._prefetcher = None
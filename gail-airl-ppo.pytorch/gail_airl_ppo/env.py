@@ -1,11 +1,33 @@
 import gym
 import logging
+import os
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
 
 # Set gym logger level
 logging.getLogger('gym').setLevel(logging.ERROR)
 
 
-def make_env(env_id, render_mode=None):
+def _import_g1_env():
+    # Make sure g1_env is importable (it lives in the project root)
+    import sys
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    import g1_env
+    return g1_env
+
+
+def make_env(env_id, render_mode=None, num_envs=1, num_workers=None):
+    # Several environments are stepped as one vector environment.
+    # num_workers=0 keeps them in this process, otherwise they are split
+    # across worker processes (one per core by default).
+    if num_envs > 1:
+        if num_workers == 0:
+            return make_vec_env(env_id, num_envs)
+        return SubprocVecEnv(env_id, num_envs, num_workers)
+
     # For newer versions of environments with new versions
     if env_id == "InvertedPendulum-v2":
         env_id = "InvertedPendulum-v4" 
@@ -13,20 +35,21 @@ def make_env(env_id, render_mode=None):
         env_id = "Hopper-v4"
     # Allow our custom G1-v0 environment
     elif env_id == "G1-v0":
-        # Make sure g1_env is imported to register the environment
-        import sys
-        import os
-        # Add project root to path if needed
-        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        if project_root not in sys.path:
-            sys.path.insert(0, project_root)
-        import g1_env
+        g1_env = _import_g1_env()
         # Use our compatibility wrapper
         return NormalizedEnv(g1_env.make_g1_env())
     
     return NormalizedEnv(gym.make(env_id))
 
 
+def make_vec_env(env_id, num_envs):
+    """Create an in-process vector environment for env_id."""
+    if env_id == "G1-v0":
+        # All G1 robots share one MjModel.
+        return _import_g1_env().G1VecEnv(num_envs)
+    return SerialVecEnv([make_env(env_id) for _ in range(num_envs)])
+
+
 class NormalizedEnv(gym.Wrapper):
 
     def __init__(self, env):
@@ -66,3 +89,230 @@ class NormalizedEnv(gym.Wrapper):
         # Old API returns just obs
         else:
             return reset_result
+
+
+class SerialVecEnv:
+    """
+    Steps a list of single environments one after another.
+
+    Follows the same interface as g1_env.G1VecEnv: step() takes an (N, *action_shape)
+    array and returns preallocated observation, reward, terminated and truncated
+    arrays, resetting finished environments automatically.
+    """
+
+    def __init__(self, envs):
+        self.envs = envs
+        self.num_envs = len(envs)
+        self.observation_space = envs[0].observation_space
+        self.action_space = envs[0].action_space
+        self._max_episode_steps = envs[0]._max_episode_steps
+
+        self._obs = np.zeros(
+            (self.num_envs, *self.observation_space.shape), dtype=np.float32)
+        self._final_obs = np.zeros_like(self._obs)
+        self._rewards = np.zeros(self.num_envs, dtype=np.float32)
+        self._terminated = np.zeros(self.num_envs, dtype=bool)
+        self._truncated = np.zeros(self.num_envs, dtype=bool)
+        self._infos = {'final_obs': self._final_obs}
+
+    def seed(self, seed=None):
+        for i, env in enumerate(self.envs):
+            try:
+                env.seed(None if seed is None else seed + i)
+            except:
+                pass  # If the environment doesn't have a seed method, ignore
+        return [seed]
+
+    def reset(self):
+        for i, env in enumerate(self.envs):
+            self._obs[i] = _reset_obs(env)
+        return self._obs, {}
+
+    def step(self, actions):
+        for i, env in enumerate(self.envs):
+            step_result = env.step(actions[i])
+            # New gym API returns (obs, reward, terminated, truncated, info)
+            if len(step_result) == 5:
+                obs, reward, terminated, truncated, _ = step_result
+            # Old gym API returns (obs, reward, done, info)
+            else:
+                obs, reward, terminated, _ = step_result
+                truncated = False
+
+            self._rewards[i] = reward
+            self._terminated[i] = terminated
+            self._truncated[i] = truncated
+            if terminated or truncated:
+                self._final_obs[i] = obs
+                obs = _reset_obs(env)
+            self._obs[i] = obs
+
+        return self._obs, self._rewards, self._terminated, self._truncated, self._infos
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+def _reset_obs(env):
+    reset_result = env.reset()
+    # New gym API returns (obs, info)
+    if isinstance(reset_result, tuple):
+        return reset_result[0]
+    return reset_result
+
+
+def _subproc_worker(remote, parent_remote, env_id, start, num_envs):
+    parent_remote.close()
+    env = make_vec_env(env_id, num_envs)
+    remote.send((env.observation_space, env.action_space, env._max_episode_steps))
+
+    # Attach to the shared arrays allocated by the parent and view our slice.
+    specs = remote.recv()
+    shms, arrays = [], {}
+    for key, (name, shape, dtype) in specs.items():
+        shm = SharedMemory(name=name)
+        shms.append(shm)
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)[start:start + num_envs]
+
+    try:
+        while True:
+            cmd, arg = remote.recv()
+            if cmd == 'step':
+                obs, rewards, terminated, truncated, infos = env.step(arrays['actions'])
+                arrays['obs'][:] = obs
+                arrays['rewards'][:] = rewards
+                arrays['terminated'][:] = terminated
+                arrays['truncated'][:] = truncated
+                done = terminated | truncated
+                arrays['final_obs'][done] = infos['final_obs'][done]
+                remote.send(None)
+            elif cmd == 'reset':
+                arrays['obs'][:] = env.reset()[0]
+                remote.send(None)
+            elif cmd == 'seed':
+                env.seed(arg)
+                remote.send(None)
+            elif cmd == 'close':
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        env.close()
+        del arrays
+        for shm in shms:
+            shm.close()
+        remote.close()
+
+
+class SubprocVecEnv:
+    """
+    Vector environment whose sub-environments run in worker processes.
+
+    Each worker steps a contiguous slice of the environments. Actions and
+    results are exchanged through shared-memory arrays; the pipes only carry
+    short commands and acknowledgements. The interface matches G1VecEnv.
+    """
+
+    def __init__(self, env_id, num_envs, num_workers=None):
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        num_workers = max(1, min(num_workers, num_envs))
+        self.num_envs = num_envs
+        self.num_workers = num_workers
+
+        # spawn keeps MuJoCo/OpenMP state of the learner out of the workers.
+        ctx = mp.get_context('spawn')
+        counts = [len(s) for s in np.array_split(np.arange(num_envs), num_workers)]
+        self.remotes, self.processes, self._starts = [], [], []
+        start = 0
+        for count in counts:
+            remote, work_remote = ctx.Pipe()
+            process = ctx.Process(
+                target=_subproc_worker,
+                args=(work_remote, remote, env_id, start, count),
+                daemon=True
+            )
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+            self._starts.append(start)
+            start += count
+
+        spaces = [remote.recv() for remote in self.remotes]
+        self.observation_space, self.action_space, self._max_episode_steps = spaces[0]
+
+        # Allocate the shared arrays and hand their names to the workers.
+        shapes = {
+            'obs': ((num_envs, *self.observation_space.shape), np.float32),
+            'final_obs': ((num_envs, *self.observation_space.shape), np.float32),
+            'actions': ((num_envs, *self.action_space.shape), np.float32),
+            'rewards': ((num_envs,), np.float32),
+            'terminated': ((num_envs,), np.bool_),
+            'truncated': ((num_envs,), np.bool_),
+        }
+        self._shms, specs, arrays = [], {}, {}
+        for key, (shape, dtype) in shapes.items():
+            nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            shm = SharedMemory(create=True, size=nbytes)
+            self._shms.append(shm)
+            specs[key] = (shm.name, shape, dtype)
+            arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        for remote in self.remotes:
+            remote.send(specs)
+
+        self._obs = arrays['obs']
+        self._final_obs = arrays['final_obs']
+        self._actions = arrays['actions']
+        self._rewards = arrays['rewards']
+        self._terminated = arrays['terminated']
+        self._truncated = arrays['truncated']
+        self._infos = {'final_obs': self._final_obs}
+        self.closed = False
+
+    def _broadcast(self, cmd, args=None):
+        if args is None:
+            args = [None] * self.num_workers
+        for remote, arg in zip(self.remotes, args):
+            remote.send((cmd, arg))
+        for remote in self.remotes:
+            remote.recv()
+
+    def seed(self, seed=None):
+        self._broadcast(
+            'seed', [None if seed is None else seed + s for s in self._starts])
+        return [seed]
+
+    def reset(self):
+        self._broadcast('reset')
+        return self._obs, {}
+
+    def step(self, actions):
+        self._actions[:] = actions
+        self._broadcast('step')
+        return self._obs, self._rewards, self._terminated, self._truncated, self._infos
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            try:
+                remote.send(('close', None))
+            except (BrokenPipeError, EOFError):
+                pass  # The worker has already exited
+        for process in self.processes:
+            process.join()
+        self._obs = self._final_obs = self._actions = None
+        self._rewards = self._terminated = self._truncated = self._infos = None
+        for shm in self._shms:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # A caller still holds a view of the array
+            shm.unlink()
+        self.closed = True
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
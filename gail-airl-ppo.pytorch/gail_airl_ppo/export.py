@@ -0,0 +1,107 @@
+import json
+import warnings
+import torch
+from torch import nn
+
+from gail_airl_ppo.network import StateDependentPolicy, StateIndependentPolicy
+
+ACTIVATIONS = {
+    'tanh': nn.Tanh,
+    'relu': lambda: nn.ReLU(inplace=True),
+}
+EXPORT_META = 'meta.json'
+
+
+def actor_from_state_dict(state_dict, hidden_activation='tanh'):
+    """
+    Rebuild the actor saved in state_dict (actor.pth). The hidden units are
+    read from the weight shapes; a log_stds parameter means a
+    StateIndependentPolicy, otherwise a StateDependentPolicy (SAC). The
+    activation is not stored and has to be given: tanh for PPO/GAIL/AIRL,
+    relu for SAC.
+    """
+    num_layers = sum(1 for key in state_dict if key.endswith('.weight'))
+    shapes = [state_dict[f'net.{2 * i}.weight'].shape for i in range(num_layers)]
+    state_shape = (shapes[0][1],)
+    hidden_units = tuple(shape[0] for shape in shapes[:-1])
+
+    if 'log_stds' in state_dict:
+        actor = StateIndependentPolicy(
+            state_shape=state_shape,
+            action_shape=(shapes[-1][0],),
+            hidden_units=hidden_units,
+            hidden_activation=ACTIVATIONS[hidden_activation]()
+        )
+    else:
+        actor = StateDependentPolicy(
+            state_shape=state_shape,
+            action_shape=(shapes[-1][0] // 2,),
+            hidden_units=hidden_units,
+            hidden_activation=ACTIVATIONS[hidden_activation]()
+        )
+    actor.load_state_dict(state_dict)
+    return actor.eval()
+
+
+def actor_shapes(actor):
+    """(state_shape, action_shape) of a policy built by actor_from_state_dict"""
+    action_dim = actor.net[-1].out_features
+    if not hasattr(actor, 'log_stds'):
+        action_dim //= 2
+    return (actor.net[0].in_features,), (action_dim,)
+
+
+def quantize_actor(actor):
+    """
+    Copy of actor with dynamically quantized int8 Linear layers: weights are
+    stored as int8 and activations are quantized per call. CPU only; the
+    result can be passed to export_actor.
+    """
+    with warnings.catch_warnings():
+        # torch.ao.quantization is deprecated in favour of the separate
+        # torchao package, which is not a dependency here.
+        warnings.simplefilter('ignore', DeprecationWarning)
+        warnings.simplefilter('ignore', UserWarning)
+        return torch.ao.quantization.quantize_dynamic(
+            actor, {nn.Linear}, dtype=torch.qint8)
+
+
+class DeterministicActor(nn.Module):
+    """The actor's deterministic action with its input and output shapes"""
+
+    def __init__(self, actor, state_shape, action_shape):
+        super().__init__()
+        self.actor = actor
+        self.state_shape = list(state_shape)
+        self.action_shape = list(action_shape)
+
+    def forward(self, states):
+        return self.actor(states)
+
+
+def export_actor(actor, path, state_shape, action_shape, extra_meta=None):
+    """
+    Save actor as a frozen TorchScript module that torch.jit.load can run
+    without the Python classes. The shapes are kept as module attributes
+    and, with extra_meta, in the meta.json extra file.
+    """
+    meta = {'state_shape': list(state_shape), 'action_shape': list(action_shape)}
+    meta.update(extra_meta or {})
+    # TorchScript is deprecated in recent releases but still the only format
+    # that loads as a plain module without the Python classes.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        module = torch.jit.script(
+            DeterministicActor(actor, state_shape, action_shape).eval())
+        module = torch.jit.freeze(
+            module, preserved_attrs=['state_shape', 'action_shape'])
+        torch.jit.save(module, path, _extra_files={EXPORT_META: json.dumps(meta)})
+
+
+def load_exported_actor(path, device=torch.device('cpu')):
+    """Load an exported actor; returns the module and its metadata"""
+    extra_files = {EXPORT_META: ''}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        module = torch.jit.load(path, map_location=device, _extra_files=extra_files)
+    return module, json.loads(extra_files[EXPORT_META])
@@ -0,0 +1,112 @@
+import numpy as np
+
+
+def _relu(x, out):
+    return np.maximum(x, 0.0, out=out)
+
+
+ACTIVATIONS = {
+    'tanh': np.tanh,
+    'relu': _relu,
+}
+
+
+class NumpyPolicy:
+    """
+    Deterministic actor (tanh of the MLP means) evaluated with NumPy only.
+
+    Weights are kept as contiguous float32 arrays of shape (out, in), and a
+    single observation runs through preallocated buffers: one matrix-vector
+    product, a bias add and an in-place activation per layer. Batches of
+    observations (N, obs_dim) take a plain, allocating path.
+    """
+
+    def __init__(self, weights, biases, hidden_activation='tanh'):
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.hidden_activation = hidden_activation
+        self._activation = ACTIVATIONS[hidden_activation]
+        self._buffers = [np.empty(len(b), dtype=np.float32) for b in self.biases]
+        self._input = np.empty(self.weights[0].shape[1], dtype=np.float32)
+
+    @property
+    def state_dim(self):
+        return self.weights[0].shape[1]
+
+    @property
+    def action_dim(self):
+        return self.weights[-1].shape[0]
+
+    def __call__(self, state, out=None):
+        """
+        Action for one observation, written into out if given (otherwise a
+        new array is returned), or for an (N, obs_dim) batch.
+        """
+        state = np.asarray(state)
+        if state.ndim == 2:
+            return self._forward_batch(state)
+
+        x = self._input
+        x[:] = state
+        last = len(self.weights) - 1
+        for i, (w, b, h) in enumerate(zip(self.weights, self.biases, self._buffers)):
+            np.dot(w, x, out=h)
+            h += b
+            if i < last:
+                self._activation(h, out=h)
+            x = h
+        if out is None:
+            return np.tanh(x)
+        return np.tanh(x, out=out)
+
+    def _forward_batch(self, states):
+        x = states.astype(np.float32, copy=False)
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            x = x @ w.T + b
+            if i < last:
+                self._activation(x, out=x)
+        return np.tanh(x)
+
+    def save(self, path):
+        arrays = {'hidden_activation': np.array(self.hidden_activation)}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f'weight_{i}'] = w
+            arrays[f'bias_{i}'] = b
+        np.savez(path, **arrays)
+
+
+def load_numpy_policy(path):
+    """Load a NumpyPolicy saved by NumpyPolicy.save"""
+    data = np.load(path)
+    num_layers = sum(1 for key in data.files if key.startswith('weight_'))
+    return NumpyPolicy(
+        [data[f'weight_{i}'] for i in range(num_layers)],
+        [data[f'bias_{i}'] for i in range(num_layers)],
+        str(data['hidden_activation']))
+
+
+def _to_numpy(x):
+    # Tensors are moved to the host without importing torch here
+    if hasattr(x, 'cpu'):
+        x = x.detach().cpu()
+    return np.asarray(x)
+
+
+def numpy_policy_from_state_dict(state_dict, hidden_activation='tanh'):
+    """
+    NumpyPolicy from the state_dict of a StateIndependentPolicy or a
+    StateDependentPolicy (actor.pth). The latter's network also outputs
+    log standard deviations; only the rows of the means are kept.
+    """
+    num_layers = sum(1 for key in state_dict if key.endswith('.weight'))
+    weights, biases = [], []
+    for i in range(num_layers):
+        # build_mlp puts an activation module between the linear layers
+        weights.append(_to_numpy(state_dict[f'net.{2 * i}.weight']))
+        biases.append(_to_numpy(state_dict[f'net.{2 * i}.bias']))
+    if 'log_stds' not in state_dict:
+        action_dim = len(biases[-1]) // 2
+        weights[-1] = weights[-1][:action_dim]
+        biases[-1] = biases[-1][:action_dim]
+    return NumpyPolicy(weights, biases, hidden_activation)
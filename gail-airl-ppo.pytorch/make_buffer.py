@@ -139,6 +139,14 @@ def make_buffer(csv_path, output_path, time_col='Timestamp', exclude_cols=None):
     # Estimate velocity for the last frame T-1 by repeating the last calculated velocity
     # This makes qvel align with qpos timesteps: qvel[t] is velocity *at* timestep t
     qvel = np.vstack([qvel, qvel[-1:]]) # Shape T x num_joints
+    # A timestamp that does not increase starts a new clip (unless none
+    # increases); the last frame of a clip repeats its previous velocity
+    # like the last frame of the file
+    keep = dt_values > 0
+    if not keep.any():
+        keep[:] = True
+    clip_breaks = np.flatnonzero(~keep)
+    qvel[clip_breaks[clip_breaks > 0]] = qvel[clip_breaks[clip_breaks > 0] - 1]
 
     # State s_t = [qpos_t, qvel_t] corresponds to action a_t, leading to s_{t+1}
     # states_t contains states from t=0 to T-2
@@ -184,16 +192,24 @@ def make_buffer(csv_path, output_path, time_col='Timestamp', exclude_cols=None):
         print("Skipping action normalization.")
 
 
+    # Drop the transitions across clip boundaries; every clip is an episode
+    states_t = states_t[keep]
+    next_states_t = next_states_t[keep]
+    actions_norm = actions_norm[keep]
+    clip_ids = np.cumsum(~keep)[keep]
+    episode_ends = np.flatnonzero(np.r_[clip_ids[1:] != clip_ids[:-1], True]) + 1
+    episode_index = np.stack([np.r_[0, episode_ends[:-1]], episode_ends], axis=1)
+
     num_transitions = states_t.shape[0]
-    print(f"Generated {num_transitions} transitions.")
+    print(f"Generated {num_transitions} transitions in {len(episode_index)} episode(s).")
     print(f"State dimension: {states_t.shape[1]}")
     print(f"Action dimension: {actions_norm.shape[1]}")
 
     # Create dummy rewards and dones
     rewards_t = np.zeros((num_transitions, 1), dtype=np.float32)
-    # Assume it's one long episode, only the last transition leads to a 'done' state
+    # Only the last transition of every clip leads to a 'done' state
     dones_t = np.zeros((num_transitions, 1), dtype=np.bool_)
-    dones_t[-1] = True
+    dones_t[episode_ends - 1] = True
     
     # Convert to PyTorch tensors
     states_tensor = torch.tensor(states_t, dtype=torch.float32)
@@ -214,7 +230,11 @@ def make_buffer(csv_path, output_path, time_col='Timestamp', exclude_cols=None):
         'action': actions_tensor,
         'reward': rewards_tensor,
         'done': dones_tensor,
-        'next_state': next_states_tensor
+        # Full next states keep the .pth format readable by older code;
+        # SerializedBuffer deduplicates them on load and convert_buffer.py
+        # on conversion to the columnar format.
+        'next_state': next_states_tensor,
+        'episode_index': torch.from_numpy(episode_index)
     }
     
     try:
@@ -226,6 +246,7 @@ def make_buffer(csv_path, output_path, time_col='Timestamp', exclude_cols=None):
         print(f"  Rewards:     {rewards_tensor.shape}")
         print(f"  Dones:       {dones_tensor.shape}")
         print(f"  Next States: {next_states_tensor.shape}")
+        print(f"  Episodes:    {len(episode_index)}")
     
     except Exception as e:
         print(f"Error saving buffer to {output_path}: {e}")
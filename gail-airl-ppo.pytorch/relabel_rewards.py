@@ -0,0 +1,178 @@
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+import mujoco
+
+from gail_airl_ppo.buffer import expand_next_states, load_columnar, save_columnar
+from g1_env import load_g1_model
+from g1_reward import REWARD_TERMS, compute_reward_terms, reward_weights
+
+# Goal that G1Env.reset sets for every episode
+GOAL_POS = np.array([0.25, 0.0, 0.0])
+
+# Weights of the terms that depend on the root pose, which buffers do not store
+ROOT_POSE_WEIGHTS = ('stability_reward_weight', 'goal_reward_weight',
+                     'progress_reward_weight', 'step_penalty_weight', 'tilt_penalty_weight')
+
+
+def lift_states(model, states):
+    """
+    Full qpos for 46-dim G1 observations, which only hold the joint angles.
+
+    The root pose is not part of the observation, so the model's default
+    root pose is used. Terms that depend on it (stability, goal, progress,
+    step size, tilt) are then the same for every transition; only the foot
+    separation term follows the stored joint angles.
+    """
+    states = np.asarray(states)
+    qpos = np.tile(model.qpos0, (len(states), 1))
+    qpos[:, -23:] = states[:, :23]
+    return qpos
+
+
+def load_transitions(path, model):
+    """
+    Load (prev_qpos, qpos) pairs of every transition stored in path, and
+    whether they hold the real root pose.
+
+    Supported formats:
+        .npz recordings with a 'qpos' array (T, nq) of consecutive frames and
+            an optional boolean 'done' array (T,) marking the last frame of
+            each episode (transitions across episodes are skipped);
+        buffers saved by make_buffer.py / Buffer.save (a .pth dict or a
+            columnar directory), lifted to full qpos with lift_states.
+    """
+    if path.endswith('.npz'):
+        data = np.load(path)
+        qpos = data['qpos'].astype(np.float64)
+        valid = np.ones(len(qpos) - 1, dtype=bool)
+        if 'done' in data:
+            valid &= ~data['done'][:-1].astype(bool)
+        return qpos[:-1][valid], qpos[1:][valid], True
+
+    tmp = load_columnar(path) if os.path.isdir(path) else torch.load(path)
+    states = tmp['state'].cpu().numpy()
+    next_states = expand_next_states(tmp).cpu().numpy()
+    return lift_states(model, states), lift_states(model, next_states), False
+
+
+def forward_kinematics(model, qpos, num_threads=None, chunk_size=4096):
+    """
+    Torso and foot site positions for every row of qpos, without simulating.
+
+    Rows are split into chunks that run mj_kinematics on a pool of threads,
+    each with its own MjData (MuJoCo releases the GIL while it computes).
+    """
+    torso_id = mujoco.mj_name2id(model, mujoco.mjtObj.mjOBJ_BODY, "torso")
+    left_foot_id = mujoco.mj_name2id(model, mujoco.mjtObj.mjOBJ_SITE, "left_foot")
+    right_foot_id = mujoco.mj_name2id(model, mujoco.mjtObj.mjOBJ_SITE, "right_foot")
+
+    n = len(qpos)
+    torso_pos = np.empty((n, 3))
+    left_foot_pos = np.empty((n, 3))
+    right_foot_pos = np.empty((n, 3))
+
+    def run_chunk(start):
+        data = mujoco.MjData(model)
+        for i in range(start, min(start + chunk_size, n)):
+            data.qpos[:] = qpos[i]
+            mujoco.mj_kinematics(model, data)
+            # Same fallback as G1Env: the root position if there is no torso body
+            torso_pos[i] = data.xpos[torso_id] if torso_id >= 0 else qpos[i, :3]
+            left_foot_pos[i] = data.site_xpos[left_foot_id]
+            right_foot_pos[i] = data.site_xpos[right_foot_id]
+
+    if num_threads is None:
+        num_threads = os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=num_threads) as pool:
+        list(pool.map(run_chunk, range(0, n, chunk_size)))
+
+    return {
+        'root_pos': qpos[:, :3],
+        'root_quat': qpos[:, 3:7],
+        'torso_pos': torso_pos,
+        'left_foot_pos': left_foot_pos,
+        'right_foot_pos': right_foot_pos,
+    }
+
+
+def relabel(kinematics, prev_qpos, weights, goal_pos=GOAL_POS):
+    """Reward terms of every transition for one weight setting"""
+    # The jerk penalty is always zero in G1Env (prev_action is updated first)
+    return compute_reward_terms(
+        kinematics['root_pos'], kinematics['root_quat'], prev_qpos[:, :3],
+        kinematics['torso_pos'], kinematics['left_foot_pos'],
+        kinematics['right_foot_pos'], goal_pos, weights=weights)
+
+
+def parse_weights(setting):
+    """'goal_reward_weight=5,tilt_penalty_weight=1' -> full weight dict"""
+    overrides = {}
+    for item in filter(None, setting.split(',')):
+        key, value = item.split('=')
+        overrides[key.strip()] = float(value)
+    return reward_weights(**overrides)
+
+
+def run(args):
+    model = load_g1_model()
+
+    prev_qpos, qpos, has_root_pose = load_transitions(args.input, model)
+    print(f"Loaded {len(qpos)} transitions from {args.input}")
+    settings = args.weights or ['']
+    if not has_root_pose:
+        print("Warning: the input has no root pose; stability, goal, progress, step size "
+              "and tilt are the same constant on every transition")
+        # Only a setting that ignores those terms gives rewards worth storing
+        weights = parse_weights(settings[0])
+        nonzero = [key for key in ROOT_POSE_WEIGHTS if weights[key] != 0]
+        if args.output is not None and nonzero:
+            raise ValueError(
+                f"Refusing to write rewards of a buffer without root pose: set "
+                f"{', '.join(key + '=0' for key in nonzero)} in the first weight setting")
+
+    # Forward kinematics only depends on the states, so it is done once
+    start = time.time()
+    kinematics = forward_kinematics(model, qpos, args.num_threads)
+    print(f"Forward kinematics: {time.time() - start:.2f}s")
+
+    print('setting'.ljust(40) + ''.join(name[:10].rjust(11) for name in REWARD_TERMS + ('total',)))
+    for i, setting in enumerate(settings):
+        start = time.time()
+        terms = relabel(kinematics, prev_qpos, parse_weights(setting))
+        elapsed = time.time() - start
+        means = ''.join(f"{terms[name].mean():11.4f}" for name in REWARD_TERMS + ('total',))
+        print(f"{(setting or 'default')[:39].ljust(40)}{means}   ({elapsed:.3f}s)")
+
+        # Write the rewards of the first setting back into a copy of the buffer
+        if i == 0 and args.output is not None:
+            if args.input.endswith('.npz'):
+                np.savez(args.output, **{name: terms[name] for name in terms.dtype.names})
+            elif os.path.isdir(args.input):
+                tmp = load_columnar(args.input)
+                tmp['reward'] = torch.tensor(terms['total'], dtype=torch.float32).view(-1, 1)
+                save_columnar(args.output, tmp)
+            else:
+                tmp = torch.load(args.input)
+                tmp['reward'] = torch.tensor(terms['total'], dtype=torch.float32).view(-1, 1)
+                torch.save(tmp, args.output)
+            print(f"Relabeled rewards saved to {args.output}")
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(
+        description="Recompute G1 rewards of stored trajectories for new reward weights.")
+    p.add_argument('--input', type=str, required=True,
+                   help='.npz recording with qpos, a buffer .pth file or a columnar buffer directory')
+    p.add_argument('--weights', type=str, nargs='*',
+                   help='weight settings to compare, e.g. goal_reward_weight=5,tilt_penalty_weight=1')
+    p.add_argument('--output', type=str, default=None,
+                   help='save the rewards of the first setting here (for buffers only '
+                        'if it zeroes the weights of the root-pose terms)')
+    p.add_argument('--num_threads', type=int, default=None)
+    args = p.parse_args()
+    run(args)
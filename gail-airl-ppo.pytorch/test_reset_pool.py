@@ -0,0 +1,28 @@
+import numpy as np
+
+from g1_env import G1Env, load_g1_model
+
+print("Checking that seeded resets are reproducible across G1Env instances...")
+
+model = load_g1_model()
+seeds = [1, 7, 1, 42]
+
+for pool_size in (0, 16):
+    # A fresh env, and one that has already been seeded, reset and stepped
+    fresh = G1Env(model=model, verbose=False, reset_pool_size=pool_size)
+    used = G1Env(model=model, verbose=False, reset_pool_size=pool_size)
+    used.reset(seed=123)
+    for _ in range(3):
+        used.step(used.action_space.sample())
+    used.seed(5)
+
+    for seed in seeds:
+        obs_fresh, _ = fresh.reset(seed=seed)
+        obs_fresh = obs_fresh.copy()
+        obs_used, _ = used.reset(seed=seed)
+        new, _ = G1Env(model=model, verbose=False, reset_pool_size=pool_size).reset(seed=seed)
+        assert np.array_equal(obs_fresh, obs_used) and np.array_equal(obs_fresh, new), \
+            f"reset(seed={seed}) differs between instances (reset_pool_size={pool_size})"
+    print(f"  reset_pool_size={pool_size}: reset(seed=s) identical for seeds {seeds}")
+
+print("Reset pool test successful!")
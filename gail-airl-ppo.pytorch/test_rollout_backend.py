@@ -0,0 +1,39 @@
+import time
+import numpy as np
+
+from g1_env import G1VecEnv
+
+# Joint angle difference (rad) allowed between the two backends, for the
+# median robot. The rollout backend damps velocities through joint damping,
+# so single robots can drift further apart after chaotic contacts.
+MAX_JOINT_DIFF = 0.05
+
+print("Comparing the rollout and python physics backends of G1VecEnv...")
+
+num_envs, num_steps = 8, 200
+rng = np.random.RandomState(0)
+actions = rng.uniform(-1, 1, size=(num_steps, num_envs, 23)).astype(np.float32)
+
+results = {}
+for backend in ('python', 'rollout'):
+    env = G1VecEnv(num_envs, backend=backend, nthread=2)
+    obs, _ = env.reset(seed=0)
+    joints, done_at = [], np.full(num_envs, num_steps)
+    start = time.perf_counter()
+    for t in range(num_steps):
+        obs, _, terminated, truncated, _ = env.step(actions[t])
+        done_at = np.where((terminated | truncated) & (done_at == num_steps), t, done_at)
+        joints.append(obs[:, :23].copy())
+    elapsed = time.perf_counter() - start
+    env.close()
+    results[backend] = np.stack(joints), done_at
+    print(f"  {backend:<8} {elapsed / num_steps * 1e3:.2f} ms per batch step")
+
+# Only compare the steps before either backend ended an episode
+(joints_py, done_py), (joints_ro, done_ro) = results['python'], results['rollout']
+diffs = [np.abs(joints_py[:min(done_py[i], done_ro[i]), i] - joints_ro[:min(done_py[i], done_ro[i]), i]).max(initial=0.0)
+         for i in range(num_envs)]
+print(f"Joint angle difference: median {np.median(diffs):.4f} rad (bound {MAX_JOINT_DIFF}), "
+      f"max {max(diffs):.4f} rad")
+assert np.median(diffs) < MAX_JOINT_DIFF, "rollout backend diverged from the python backend"
+print("Rollout backend test successful!")
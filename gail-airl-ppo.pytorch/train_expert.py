@@ -16,7 +16,13 @@ def run(args):
         state_shape=env.observation_space.shape,
         action_shape=env.action_space.shape,
         device=torch.device("cuda" if args.cuda else "cpu"),
-        seed=args.seed
+        seed=args.seed,
+        buffer_dtype=getattr(torch, args.buffer_dtype),
+        prefetch_depth=args.prefetch_depth,
+        prioritized=args.prioritized,
+        priority_beta_steps=args.priority_beta_steps or args.num_steps,
+        replay_dir=args.replay_dir,
+        chunk_size=args.chunk_size
     )
 
     time = datetime.now().strftime("%Y%m%d-%H%M")
@@ -40,6 +46,15 @@ if __name__ == '__main__':
     p.add_argument('--num_steps', type=int, default=10**6)
     p.add_argument('--eval_interval', type=int, default=10**4)
     p.add_argument('--env_id', type=str, default='Hopper-v3')
+    p.add_argument('--buffer_dtype', type=str, default='float32',
+                   choices=['float32', 'float16', 'bfloat16'])
+    p.add_argument('--prefetch_depth', type=int, default=0)
+    p.add_argument('--prioritized', action='store_true')
+    p.add_argument('--priority_beta_steps', type=int, default=None,
+                   help='updates over which beta is annealed to 1 (default: num_steps)')
+    p.add_argument('--replay_dir', type=str, default=None,
+                   help='keep the replay buffer on disk in chunks under this directory')
+    p.add_argument('--chunk_size', type=int, default=10**5)
     p.add_argument('--cuda', action='store_true')
     p.add_argument('--seed', type=int, default=0)
     args = p.parse_args()
@@ -14,7 +14,8 @@ def run(args):
     env_test = make_env(args.env_id)
     buffer_exp = SerializedBuffer(
         path=args.buffer,
-        device=torch.device("cuda" if args.cuda else "cpu")
+        device=torch.device("cuda" if args.cuda else "cpu"),
+        storage_dtype=getattr(torch, args.buffer_dtype)
     )
     
     # Add debugging information
@@ -29,7 +30,11 @@ def run(args):
         action_shape=env.action_space.shape,
         device=torch.device("cuda" if args.cuda else "cpu"),
         seed=args.seed,
-        rollout_length=args.rollout_length
+        rollout_length=args.rollout_length,
+        num_minibatches=args.num_minibatches,
+        minibatch_size=args.minibatch_size,
+        target_kl=args.target_kl,
+        prefetch_depth=args.prefetch_depth
     )
 
     time = datetime.now().strftime("%Y%m%d-%H%M")
@@ -52,10 +57,16 @@ if __name__ == '__main__':
     p = argparse.ArgumentParser()
     p.add_argument('--buffer', type=str, required=True)
     p.add_argument('--rollout_length', type=int, default=50000)
+    p.add_argument('--num_minibatches', type=int, default=1)
+    p.add_argument('--minibatch_size', type=int, default=None)
+    p.add_argument('--target_kl', type=float, default=None)
+    p.add_argument('--prefetch_depth', type=int, default=0)
     p.add_argument('--num_steps', type=int, default=10**7)
     p.add_argument('--eval_interval', type=int, default=10**5)
     p.add_argument('--env_id', type=str, default='Hopper-v3')
     p.add_argument('--algo', type=str, default='gail')
+    p.add_argument('--buffer_dtype', type=str, default='float32',
+                   choices=['float32', 'float16', 'bfloat16'])
     p.add_argument('--cuda', action='store_true')
     p.add_argument('--seed', type=int, default=0)
     args = p.parse_args()
@@ -16,6 +16,7 @@ except ImportError:
 
 # Import policy model
 from gail_airl_ppo.network.policy import StateIndependentPolicy
+from gail_airl_ppo.numpy_policy import numpy_policy_from_state_dict
 
 # Get the absolute path of the current file's directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -75,6 +76,10 @@ def run(args):
     policy.load_state_dict(torch.load(model_path, map_location=device))
     policy.eval()
     print("Policy loaded successfully")
+    if args.numpy:
+        # Framework-free forward pass for the control loop
+        numpy_policy = numpy_policy_from_state_dict(policy.state_dict())
+        print("Using the NumPy actor")
     
     # For debugging - print a small part of model weights
     for name, param in policy.named_parameters():
@@ -139,10 +144,13 @@ def run(args):
                 obs = np.concatenate([joint_angles, joint_vels])
                 
                 # Use policy to get action
-                with torch.no_grad():
-                    obs_tensor = torch.tensor(obs, dtype=torch.float32, device=device).unsqueeze(0)
-                    action_tensor = policy(obs_tensor)
-                action = action_tensor.cpu().numpy().squeeze()
+                if args.numpy:
+                    action = numpy_policy(obs)
+                else:
+                    with torch.no_grad():
+                        obs_tensor = torch.tensor(obs, dtype=torch.float32, device=device).unsqueeze(0)
+                        action_tensor = policy(obs_tensor)
+                    action = action_tensor.cpu().numpy().squeeze()
                 
                 # Apply action to joint actuators
                 data.ctrl[:] = action
@@ -241,6 +249,7 @@ if __name__ == '__main__':
     parser.add_argument('--fps', type=int, default=30, help='Rendering frame rate')
     parser.add_argument('--seed', type=int, default=0, help='Random seed')
     parser.add_argument('--cuda', action='store_true', help='Use CUDA if available')
+    parser.add_argument('--numpy', action='store_true', help='Run the actor with NumPy instead of torch')
     args = parser.parse_args()
     
     try: